@@ -1,23 +1,63 @@
 import math
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 OSRM_BASE = "http://router.project-osrm.org/route/v1"
+OSRM_TABLE_BASE = "http://router.project-osrm.org/table/v1"
+# The public OSRM server caps table requests at 100 coordinates (99 sources + the destination).
+OSRM_TABLE_MAX_SOURCES = 99
 REQUEST_DELAY = 0.5
+OSRM_WORKERS = 4
 
+# Shared keep-alive session for route/table calls (also used from the worker pool).
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+    ),
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
 
-def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+
+def haversine_np(
+    lats: np.ndarray, lngs: np.ndarray, eu_lat: float, eu_lng: float
+) -> np.ndarray:
+    """Straight-line distances (km) from every (lat, lng) pair to a single point."""
     R = 6371.0
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(math.radians(lat1))
-        * math.cos(math.radians(lat2))
-        * math.sin(dlon / 2) ** 2
-    )
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    # Scalar terms for the fixed endpoint are computed once; array work reuses
+    # two scratch buffers in place instead of allocating a temporary per operator.
+    cos_eu = math.cos(math.radians(eu_lat))
+
+    a = np.radians(eu_lat - lats)
+    a *= 0.5
+    np.sin(a, out=a)
+    np.square(a, out=a)
+
+    t = np.radians(eu_lng - lngs)
+    t *= 0.5
+    np.sin(t, out=t)
+    np.square(t, out=t)
+    t *= np.cos(np.radians(lats))
+    t *= cos_eu
+    a += t
+
+    np.subtract(1.0, a, out=t)
+    np.sqrt(t, out=t)
+    np.sqrt(a, out=a)
+    np.arctan2(a, t, out=a)
+    a *= 2 * R
+    return a
 
 
 def osrm_route(
@@ -28,9 +68,9 @@ def osrm_route(
     params = {"overview": "false"}
     try:
         time.sleep(REQUEST_DELAY)
-        resp = requests.get(url, params=params, timeout=15)
+        resp = _SESSION.get(url, params=params, timeout=15)
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         if data.get("code") == "Ok" and data.get("routes"):
             route = data["routes"][0]
             duration_min = route["duration"] / 60.0
@@ -41,43 +81,132 @@ def osrm_route(
     return None
 
 
+def osrm_table(
+    origins: list[tuple[float, float]], lat: float, lon: float, profile: str = "driving"
+) -> list[tuple[float, float] | None] | None:
+    """
+    Query the OSRM table service for many origins -> one destination.
+
+    Returns one (duration_minutes, distance_km) entry per origin (None where OSRM
+    found no route), or None if the request itself failed.
+    """
+    n = len(origins)
+    coords = ";".join(f"{o_lng},{o_lat}" for o_lat, o_lng in origins) + f";{lon},{lat}"
+    url = f"{OSRM_TABLE_BASE}/{profile}/{coords}"
+    params = {
+        "sources": ";".join(str(i) for i in range(n)),
+        "destinations": str(n),
+        "annotations": "duration,distance",
+    }
+    try:
+        time.sleep(REQUEST_DELAY)
+        resp = _SESSION.get(url, params=params, timeout=30)
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+        if data.get("code") != "Ok":
+            print(f"    OSRM table error ({profile}): {data.get('code')}")
+            return None
+        durations = data["durations"]
+        distances = data["distances"]
+        out: list[tuple[float, float] | None] = []
+        for i in range(n):
+            duration_s = durations[i][0]
+            distance_m = distances[i][0]
+            if duration_s is None or distance_m is None:
+                out.append(None)
+            else:
+                out.append((round(duration_s / 60.0, 1), round(distance_m / 1000.0, 2)))
+        return out
+    except Exception as e:
+        print(f"    OSRM table error ({profile}): {e}")
+    return None
+
+
+def _table_routes(
+    located: list[dict], eu_lat: float, eu_lng: float, profile: str
+) -> list[tuple[float, float] | None] | None:
+    """Table lookups for all listings, batched to the server's coordinate limit."""
+    routes: list[tuple[float, float] | None] = []
+    for start in range(0, len(located), OSRM_TABLE_MAX_SOURCES):
+        batch = located[start : start + OSRM_TABLE_MAX_SOURCES]
+        result = osrm_table([(l["lat"], l["lng"]) for l in batch], eu_lat, eu_lng, profile)
+        if result is None:
+            return None
+        routes.extend(result)
+    return routes
+
+
 def compute_distances(
     listings: list[dict], eu_lat: float, eu_lng: float
 ) -> list[dict]:
-    total = len(listings)
-    for i, listing in enumerate(listings, 1):
-        lat = listing.get("lat")
-        lng = listing.get("lng")
+    # Structure-of-arrays view of the coordinates; missing values become NaN.
+    n = len(listings)
+    lats = np.fromiter(
+        (np.nan if l.get("lat") is None else l["lat"] for l in listings), dtype=float, count=n
+    )
+    lngs = np.fromiter(
+        (np.nan if l.get("lng") is None else l["lng"] for l in listings), dtype=float, count=n
+    )
+    valid = ~(np.isnan(lats) | np.isnan(lngs))
+    straight = np.round(haversine_np(lats[valid], lngs[valid], eu_lat, eu_lng), 2)
 
-        if lat is None or lng is None:
-            listing["walk_mins_to_eu"] = None
-            listing["walk_km_to_eu"] = None
-            listing["drive_mins_to_eu"] = None
-            listing["drive_km_to_eu"] = None
-            listing["straight_line_km_to_eu"] = None
-            continue
+    located = [listings[i] for i in np.flatnonzero(valid)]
+    for listing, d in zip(located, straight.tolist()):
+        listing["straight_line_km_to_eu"] = d
 
-        street = listing.get("street", "?")
-        print(f"  [{i}/{total}] Distance for #{listing['id']} ({street})...")
+    for i in np.flatnonzero(~valid):
+        listing = listings[i]
+        listing["walk_mins_to_eu"] = None
+        listing["walk_km_to_eu"] = None
+        listing["drive_mins_to_eu"] = None
+        listing["drive_km_to_eu"] = None
+        listing["straight_line_km_to_eu"] = None
 
-        listing["straight_line_km_to_eu"] = round(
-            haversine_km(lat, lng, eu_lat, eu_lng), 2
-        )
+    # One table request per profile (per batch) instead of one route request per listing.
+    # OSRM calls are pure network waits: the driving and walking tables are independent,
+    # so both go out together on a small bounded pool. Each worker still sleeps
+    # REQUEST_DELAY before its request, so the public server sees at most
+    # OSRM_WORKERS requests per REQUEST_DELAY.
+    profiles = ("driving", "walking")
+    routes: dict[str, list[tuple[float, float] | None] | None] = {}
+    with ThreadPoolExecutor(max_workers=OSRM_WORKERS) as ex:
+        print(f"  OSRM table ({', '.join(profiles)}) for {len(located)} listings...")
+        table_futures = {
+            ex.submit(_table_routes, located, eu_lat, eu_lng, profile): profile
+            for profile in profiles
+        }
+        for fut in as_completed(table_futures):
+            routes[table_futures[fut]] = fut.result()
 
-        driving = osrm_route(lat, lng, eu_lat, eu_lng, "driving")
+        # Fall back to per-listing route requests only for profiles whose table call failed.
+        failed = [p for p in profiles if routes[p] is None]
+        for profile in failed:
+            print(f"  OSRM table ({profile}) failed; falling back to per-listing routes...")
+            routes[profile] = [None] * len(located)
+        futures = {
+            ex.submit(osrm_route, l["lat"], l["lng"], eu_lat, eu_lng, profile): (i, profile)
+            for profile in failed
+            for i, l in enumerate(located)
+        }
+        for fut in as_completed(futures):
+            i, profile = futures[fut]
+            routes[profile][i] = fut.result()
+
+    for i, listing in enumerate(located):
+        driving = routes["driving"][i]
+        walking = routes["walking"][i]
         if driving:
             listing["drive_mins_to_eu"], listing["drive_km_to_eu"] = driving
-            print(f"    Drive: {driving[0]} min, {driving[1]} km")
         else:
             listing["drive_mins_to_eu"] = None
             listing["drive_km_to_eu"] = None
-
-        walking = osrm_route(lat, lng, eu_lat, eu_lng, "walking")
         if walking:
             listing["walk_mins_to_eu"], listing["walk_km_to_eu"] = walking
-            print(f"    Walk: {walking[0]} min, {walking[1]} km")
         else:
             listing["walk_mins_to_eu"] = None
             listing["walk_km_to_eu"] = None
 
+    routed = sum(1 for l in located if l.get("drive_mins_to_eu") is not None)
+    print(f"  Routed {routed}/{len(located)} listings")
+
     return listings
@@ -5,9 +5,11 @@ Reads listing IDs from shortlist_ids.txt (one ID per line) and data from data/li
 """
 
 import csv
-import json
 from pathlib import Path
 
+import ijson
+import orjson
+
 BASE = "https://besthouse.am/en/estates/"
 
 
@@ -23,10 +25,13 @@ def main() -> None:
     id_set = set(id_list)
     id_order = {lid: i for i, lid in enumerate(id_list)}
 
-    with open(listings_path, "r", encoding="utf-8") as f:
-        all_listings = json.load(f)
-
-    rows = [L for L in all_listings if isinstance(L, dict) and L.get("id") in id_set]
+    # Stream the listings array so only shortlisted rows are ever materialized.
+    with open(listings_path, "rb") as f:
+        rows = [
+            L
+            for L in ijson.items(f, "item", use_float=True)
+            if isinstance(L, dict) and L.get("id") in id_set
+        ]
     rows.sort(key=lambda L: id_order.get(L["id"], 999))
 
     def cell(L: dict, key: str, default=""):
@@ -65,14 +70,12 @@ def main() -> None:
     with open(out_path, "w", encoding="utf-8", newline="") as f:
         w = csv.writer(f)
         w.writerow([c[0] for c in columns])
-        for L in rows:
-            w.writerow([cell(L, c[1]) for c in columns])
+        w.writerows([cell(L, c[1]) for c in columns] for L in rows)
 
     # Keep frontend shortlist.json in sync (used as default favorites when localStorage is empty)
     urls = [L.get("url") or f"{BASE}{L['id']}" for L in rows if L.get("id")]
     frontend_shortlist.parent.mkdir(parents=True, exist_ok=True)
-    with open(frontend_shortlist, "w", encoding="utf-8") as f:
-        json.dump(urls, f, indent=2)
+    frontend_shortlist.write_bytes(orjson.dumps(urls, option=orjson.OPT_INDENT_2))
 
     print(f"Wrote {len(rows)} rows to {out_path} and {frontend_shortlist.name}")
 
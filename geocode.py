@@ -1,21 +1,42 @@
+import atexit
 import json
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from output import write_json
 
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 HEADERS = {"User-Agent": "YerevanHousingIndex/1.0 (personal research project)"}
 REQUEST_DELAY = 1.1  # Nominatim policy: max 1 req/sec
+GEOCODE_WORKERS = 4
 OVERRIDES_PATH = Path("data/geocode_overrides.json")
 DISTRICT_BBOX_CACHE_PATH = Path("data/district_bbox.json")
+GEOCODE_CACHE_PATH = Path("data/geocode_cache.json")
 
 # Allow a small amount of wiggle room for district boundaries / bbox approximations.
 # (From the attached plan: ~300m tolerance in degrees.)
 BBOX_BUFFER = 0.003
 
 _DISTRICT_BBOX_MEM_CACHE: dict[str, tuple[float, float, float, float]] | None = None
+_EXPANDED_BBOX_MEM_CACHE: dict[str, tuple[float, float, float, float] | None] = {}
+# Nominatim search params (JSON-encoded) -> [lat, lng], or None for "no result".
+# Misses are kept across runs like hits (request errors are never cached); to retry them,
+# e.g. after fixing a query builder, delete data/geocode_cache.json.
+_GEOCODE_MEM_CACHE: dict[str, list[float] | None] | None = None
+_GEOCODE_CACHE_DIRTY = False
+_CACHE_LOCK = threading.Lock()
+
+# Global request gate shared by all geocoding workers.
+_RATE_LOCK = threading.Lock()
+_last_request_at = 0.0
 
 DISTRICT_ALIASES = {
     "Center": "Kentron",
@@ -29,38 +50,104 @@ DISTRICT_ALIASES = {
 EU_DELEGATION_ADDRESS = "21 Frik Street, Yerevan, Armenia"
 EU_DELEGATION_FALLBACK = (40.1852, 44.5136)
 
+# Reused for every Nominatim call so the TLS connection survives the rate-limit sleeps.
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_ADAPTER = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+    ),
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+
+def _throttle():
+    """
+    Block until REQUEST_DELAY has passed since the previous Nominatim request.
+
+    The lock is held while sleeping, so concurrent workers queue up and the
+    process as a whole never exceeds Nominatim's 1 req/sec policy.
+    """
+    global _last_request_at
+    with _RATE_LOCK:
+        wait = _last_request_at + REQUEST_DELAY - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request_at = time.monotonic()
+
 
-def _nominatim_search(params: dict) -> list[dict]:
-    time.sleep(REQUEST_DELAY)
+def _nominatim_search(params: dict) -> list[dict] | None:
+    """Run one Nominatim search. Returns the result list, or None on request errors."""
+    _throttle()
     try:
-        resp = requests.get(NOMINATIM_URL, params=params, headers=HEADERS, timeout=15)
+        resp = _SESSION.get(NOMINATIM_URL, params=params, timeout=15)
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content)
         return data if isinstance(data, list) else []
     except Exception as e:
         q = params.get("q") or params.get("street") or "?"
         print(f"    Geocoding error for '{q}': {e}")
-        return []
+        return None
+
+
+def _load_geocode_cache() -> dict[str, list[float] | None]:
+    if GEOCODE_CACHE_PATH.exists():
+        try:
+            with open(GEOCODE_CACHE_PATH, encoding="utf-8") as f:
+                raw = json.load(f)
+            if isinstance(raw, dict):
+                return {k: v for k, v in raw.items() if v is None or (isinstance(v, list) and len(v) == 2)}
+        except Exception:
+            return {}
+    return {}
+
+
+def _save_geocode_cache():
+    if not _GEOCODE_CACHE_DIRTY or _GEOCODE_MEM_CACHE is None:
+        return
+    GEOCODE_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # Atomic: a kill mid-write must not truncate the file, which would load as an empty cache.
+    write_json(GEOCODE_CACHE_PATH, dict(sorted(_GEOCODE_MEM_CACHE.items())))
+
+
+def _geocode_cache() -> dict[str, list[float] | None]:
+    """Persistent query cache, loaded on first use and flushed to disk at exit."""
+    global _GEOCODE_MEM_CACHE
+    with _CACHE_LOCK:
+        if _GEOCODE_MEM_CACHE is None:
+            _GEOCODE_MEM_CACHE = _load_geocode_cache()
+            atexit.register(_save_geocode_cache)
+    return _GEOCODE_MEM_CACHE
 
 
 def geocode_address(
-    query: str,
+    query: str | dict[str, str],
     *,
     viewbox: tuple[float, float, float, float] | None = None,
     bounded: bool = False,
 ) -> tuple[float, float] | None:
     """
-    Geocode a free-text query via Nominatim.
+    Geocode a query via Nominatim.
+
+    query is either free text or a dict of structured-search fields (street, city, country, ...).
 
     If viewbox is provided, it is interpreted as (south, north, west, east) and passed to Nominatim
     as a bounded search (when bounded=True).
     """
     params: dict = {
-        "q": query,
         "format": "json",
         "limit": 1,
         "countrycodes": "am",
     }
+    if isinstance(query, dict):
+        params.update(query)
+    else:
+        params["q"] = query
     if viewbox is not None:
         south, north, west, east = viewbox
         # Nominatim expects viewbox as: left,top,right,bottom (lon/lat).
@@ -68,13 +155,26 @@ def geocode_address(
         if bounded:
             params["bounded"] = 1
 
+    global _GEOCODE_CACHE_DIRTY
+    cache = _geocode_cache()
+    key = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    if key in cache:
+        hit = cache[key]
+        return (hit[0], hit[1]) if hit else None
+
     results = _nominatim_search(params)
+    if results is None:
+        # Request error: don't cache, so the next run tries again.
+        return None
+    result = None
     if results:
         try:
-            return float(results[0]["lat"]), float(results[0]["lon"])
+            result = float(results[0]["lat"]), float(results[0]["lon"])
         except Exception:
-            return None
-    return None
+            result = None
+    cache[key] = list(result) if result else None
+    _GEOCODE_CACHE_DIRTY = True
+    return result
 
 
 def load_overrides() -> dict:
@@ -155,17 +255,19 @@ def get_district_bbox(osm_district: str) -> tuple[float, float, float, float] |
     osm_district = (osm_district or "").strip()
     if not osm_district:
         return None
-    if _DISTRICT_BBOX_MEM_CACHE is None:
-        _DISTRICT_BBOX_MEM_CACHE = _load_district_bbox_cache()
-    cache = _DISTRICT_BBOX_MEM_CACHE
-    if osm_district in cache:
-        return cache[osm_district]
-    bbox = _fetch_district_bbox(osm_district)
-    if bbox is None:
-        return None
-    cache[osm_district] = bbox
-    _save_district_bbox_cache(cache)
-    return bbox
+    # Held across the fetch so concurrent workers don't look up (and save) the same district twice.
+    with _CACHE_LOCK:
+        if _DISTRICT_BBOX_MEM_CACHE is None:
+            _DISTRICT_BBOX_MEM_CACHE = _load_district_bbox_cache()
+        cache = _DISTRICT_BBOX_MEM_CACHE
+        if osm_district in cache:
+            return cache[osm_district]
+        bbox = _fetch_district_bbox(osm_district)
+        if bbox is None:
+            return None
+        cache[osm_district] = bbox
+        _save_district_bbox_cache(cache)
+        return bbox
 
 
 def _expand_bbox(
@@ -175,6 +277,22 @@ def _expand_bbox(
     return (south - buffer_deg, north + buffer_deg, west - buffer_deg, east + buffer_deg)
 
 
+def district_viewbox(district: str) -> tuple[float, float, float, float] | None:
+    """
+    Expanded bbox for a raw district label (alias-resolved), memoized per process.
+
+    Unknown districts are memoized as None too, so a failed lookup isn't retried
+    against Nominatim for every listing.
+    """
+    if district in _EXPANDED_BBOX_MEM_CACHE:
+        return _EXPANDED_BBOX_MEM_CACHE[district]
+    osm_district = DISTRICT_ALIASES.get(district, district).strip()
+    bbox = get_district_bbox(osm_district) if osm_district else None
+    vbox = _expand_bbox(bbox) if bbox else None
+    _EXPANDED_BBOX_MEM_CACHE[district] = vbox
+    return vbox
+
+
 def in_district_bbox(lat: float, lng: float, district: str) -> bool | None:
     """
     Returns:
@@ -183,13 +301,10 @@ def in_district_bbox(lat: float, lng: float, district: str) -> bool | None:
     """
     if lat is None or lng is None:
         return None
-    osm_district = DISTRICT_ALIASES.get(district or "", district or "").strip()
-    if not osm_district:
-        return None
-    bbox = get_district_bbox(osm_district)
-    if bbox is None:
+    vbox = district_viewbox(district or "")
+    if vbox is None:
         return None
-    south, north, west, east = _expand_bbox(bbox)
+    south, north, west, east = vbox
     return (south <= lat <= north) and (west <= lng <= east)
 
 
@@ -201,11 +316,16 @@ STREET_ALIASES = {
 }
 
 
+_PAREN_RE = re.compile(r"\s*\([^)]*\)\s*")
+_DISTRICT_SUFFIX_RE = re.compile(r"\s+district$", re.I)
+_WS_RE = re.compile(r"\s+")
+
+
 def _normalize_street(raw_street: str) -> str:
     s = raw_street or ""
-    s = re.sub(r"\s*\([^)]*\)\s*", " ", s).strip()
-    s = re.sub(r"\s+district$", "", s, flags=re.I).strip()
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _PAREN_RE.sub(" ", s).strip()
+    s = _DISTRICT_SUFFIX_RE.sub("", s).strip()
+    s = _WS_RE.sub(" ", s).strip()
     aliased = STREET_ALIASES.get(s.lower())
     return aliased if aliased else s
 
@@ -221,7 +341,7 @@ def geocode_eu_delegation() -> tuple[float, float]:
 
 
 def _try_geocode(
-    query: str,
+    query: str | dict[str, str],
     district: str,
     viewbox: tuple[float, float, float, float] | None,
 ) -> tuple[float, float] | None:
@@ -250,6 +370,9 @@ def _try_geocode(
 
 
 def geocode_listing(listing: dict, overrides: dict) -> dict:
+    """
+    Geocode one listing in place, trying progressively coarser queries.
+    """
     lid = str(listing["id"])
 
     # Some sources provide their own (approximate) coordinates.
@@ -272,12 +395,13 @@ def geocode_listing(listing: dict, overrides: dict) -> dict:
 
     # Non-bounded viewbox preference — nudges Nominatim toward the correct area
     # without hard-rejecting results outside the rectangle.
-    district_bbox = get_district_bbox(osm_district) if osm_district else None
-    vbox = _expand_bbox(district_bbox) if district_bbox else None
+    vbox = district_viewbox(district)
 
-    # --- tier 1: full address ---
+    # --- tier 1: full address (structured search: fewer false positives than free text) ---
+    # The district is carried by the viewbox bias + bbox check rather than a field, since
+    # Yerevan districts are not a Nominatim "city".
     if address_number and street:
-        q = f"{address_number} {street}, {osm_district}, Yerevan, Armenia"
+        q = {"street": f"{address_number} {street}", "city": "Yerevan", "country": "Armenia"}
         result = _try_geocode(q, district, vbox)
         if result:
             listing["lat"], listing["lng"] = result
@@ -326,19 +450,52 @@ def run_geocoder(listings: list[dict]) -> tuple[list[dict], tuple[float, float]]
     if already:
         print(f"  Skipping {already} already-geocoded listings")
 
+    # Warm the district_viewbox memo once up front, before the workers start reading it.
+    for district in {l.get("district", "") for l in to_geocode}:
+        district_viewbox(district)
+
+    # Listings that share (house number, street, district) would issue identical
+    # queries: geocode one representative per bucket and copy the result to the rest.
+    # Overrides are per-listing, so those are never bucketed.
+    buckets: dict[tuple, list[dict]] = {}
+    for listing in to_geocode:
+        if str(listing["id"]) in overrides:
+            key: tuple = ("id", listing["id"])
+        else:
+            key = (
+                str(listing.get("parsed_address_number") or ""),
+                _normalize_street(listing.get("street", "")),
+                listing.get("district", ""),
+            )
+        buckets.setdefault(key, []).append(listing)
+    if len(buckets) < len(to_geocode):
+        print(f"  {len(to_geocode)} listings share {len(buckets)} unique queries")
+
+    # Workers overlap response handling and retries; _throttle keeps the
+    # combined request rate within Nominatim's policy. Tiers stay sequential per listing.
     failed = []
     total = len(to_geocode)
-    for i, listing in enumerate(to_geocode, 1):
-        lid = listing["id"]
-        street = listing.get("street", "unknown")
-        print(f"  [{i}/{total}] Geocoding #{lid} ({street})...")
-        geocode_listing(listing, overrides)
-        precision = listing.get("geocode_precision", "?")
-        if listing.get("lat"):
-            print(f"    -> {listing['lat']:.5f}, {listing['lng']:.5f} ({precision})")
-        else:
-            print(f"    -> FAILED")
-            failed.append(listing)
+    i = 0
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as ex:
+        futures = {ex.submit(geocode_listing, group[0], overrides): group for group in buckets.values()}
+        for fut in as_completed(futures):
+            group = futures[fut]
+            fut.result()
+            rep = group[0]
+            for listing in group[1:]:
+                listing["lat"] = rep.get("lat")
+                listing["lng"] = rep.get("lng")
+                listing["geocode_precision"] = rep.get("geocode_precision")
+            for listing in group:
+                i += 1
+                lid = listing["id"]
+                street = listing.get("street", "unknown")
+                precision = listing.get("geocode_precision", "?")
+                if listing.get("lat"):
+                    print(f"  [{i}/{total}] #{lid} ({street}) -> {listing['lat']:.5f}, {listing['lng']:.5f} ({precision})")
+                else:
+                    print(f"  [{i}/{total}] #{lid} ({street}) -> FAILED")
+                    failed.append(listing)
 
     new_overrides = {}
     for listing in failed:
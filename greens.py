@@ -1,8 +1,15 @@
-import json
+import os
+import re
 import time
 from pathlib import Path
+from typing import Iterable, Iterator
 
+import ijson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from output import write_json
 
 
 OVERPASS_URLS = [
@@ -16,49 +23,103 @@ HEADERS = {"User-Agent": "YerevanHousingIndex/1.0 (personal research project)"}
 YEREVAN_BBOX = (40.10, 44.40, 40.30, 44.65)
 REQUEST_DELAY = 1.1
 
+# urllib3 retries 429/5xx (honouring Retry-After) on each mirror, so _post_overpass
+# only has to walk the mirror list.
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=frozenset({"GET", "POST"}),
+    ),
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+
+_REMARK_RE = re.compile(rb'"remark"\s*:\s*"((?:[^"\\]|\\.)*)"')
 
-def _post_overpass(query: str) -> dict:
+
+def _runtime_error_remark(path: Path) -> str | None:
+    """
+    The "runtime error" remark of an aborted Overpass response, or None.
+
+    Timeouts and maxsize aborts still arrive as HTTP 200 with partial elements; the remark
+    is the last key of the body, so only its tail needs reading.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        tail = f.read()
+    m = _REMARK_RE.search(tail)
+    if not m:
+        return None
+    remark = m.group(1).decode("utf-8", "replace").replace('\\"', '"')
+    return remark if "runtime error" in remark else None
+
+
+def _post_overpass(query: str, dest: Path) -> None:
+    """POST a query to the first Overpass mirror that answers, streaming the JSON body to dest."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
     last_err: Exception | None = None
     for url in OVERPASS_URLS:
         time.sleep(REQUEST_DELAY)
         try:
-            resp = requests.post(url, data={"data": query}, headers=HEADERS, timeout=(10, 40))
-            if resp.status_code == 429:
-                raise requests.HTTPError("429 Too Many Requests", response=resp)
-            if resp.status_code in {502, 503, 504}:
-                raise requests.HTTPError(f"{resp.status_code} Server Error", response=resp)
-            resp.raise_for_status()
-            return resp.json()
+            with _SESSION.post(
+                url, data={"data": query}, headers=HEADERS, timeout=(10, 40), stream=True
+            ) as resp:
+                resp.raise_for_status()
+                with open(tmp, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=1 << 16):
+                        f.write(chunk)
+            remark = _runtime_error_remark(tmp)
+            if remark:
+                raise RuntimeError(f"Overpass {remark}")
+            tmp.replace(dest)
+            return
         except Exception as e:
             last_err = e
             time.sleep(2.0)
+    tmp.unlink(missing_ok=True)
     if last_err:
         raise last_err
     raise RuntimeError("Overpass request failed")
 
 
-def fetch_greens_overpass(*, bbox: tuple[float, float, float, float] = YEREVAN_BBOX, cache_path: Path) -> dict:
+def _iter_elements(path: Path) -> Iterator[dict]:
+    """Yield Overpass elements one at a time without loading the whole response."""
+    with open(path, "rb") as f:
+        yield from ijson.items(f, "elements.item", use_float=True)
+
+
+def fetch_greens_overpass(
+    *, bbox: tuple[float, float, float, float] = YEREVAN_BBOX, cache_path: Path
+) -> Iterator[dict]:
+    """Iterate the Overpass green-space elements, fetching them into cache_path on first use."""
     if cache_path.exists():
-        return json.loads(cache_path.read_text(encoding="utf-8"))
+        return _iter_elements(cache_path)
 
     south, west, north, east = bbox
     # nwr = nodes + ways + relations. We request center for non-node elements so we can still render something.
+    # One regex tag filter lets Overpass scan the bbox once instead of once per leisure value.
     query = (
-        "[out:json][timeout:60];("
-        f"nwr[\"leisure\"=\"park\"]({south},{west},{north},{east});"
-        f"nwr[\"leisure\"=\"garden\"]({south},{west},{north},{east});"
-        f"nwr[\"leisure\"=\"dog_park\"]({south},{west},{north},{east});"
-        ");out center geom;"
+        "[out:json][timeout:90][maxsize:536870912];"
+        f"nwr[\"leisure\"~\"^(park|garden|dog_park)$\"]({south},{west},{north},{east});"
+        "out center geom;"
     )
-    data = _post_overpass(query)
-    cache_path.parent.mkdir(parents=True, exist_ok=True)
-    cache_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-    return data
+    # The response body goes straight to the cache file and is parsed from there
+    # incrementally: the full JSON tree is never held in memory.
+    _post_overpass(query, cache_path)
+    return _iter_elements(cache_path)
 
 
-def overpass_to_geojson(data: dict) -> dict:
+def overpass_to_geojson(elements: Iterable[dict]) -> dict:
     features: list[dict] = []
-    for e in data.get("elements", []):
+    for e in elements:
         etype = e.get("type")
         tags = e.get("tags") or {}
         leisure = tags.get("leisure")
@@ -114,8 +175,9 @@ def write_greens_geojson(*, out_path: Path, force: bool = False) -> bool:
         return False
 
     cache = Path("data/raw/overpass_greens.json")
-    data = fetch_greens_overpass(cache_path=cache)
-    geojson = overpass_to_geojson(data)
-    out_path.write_text(json.dumps(geojson, ensure_ascii=False, indent=2), encoding="utf-8")
+    elements = fetch_greens_overpass(cache_path=cache)
+    geojson = overpass_to_geojson(elements)
+    # Compact UTF-8: only the frontend map reads this file.
+    write_json(out_path, geojson, indent=False)
     return True
 
@@ -1,14 +1,20 @@
-import heapq
-import json
+import hashlib
 import os
+import pickle
 import time
-from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable
 
+import numpy as np
 import requests
 import shapely
-from shapely.geometry import MultiPoint, mapping
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from shapely.geometry import MultiPoint, mapping, shape
+
+from output import write_json
 
 
 ORS_ISOCHRONES_URL = "https://api.openrouteservice.org/v2/isochrones/foot-walking"
@@ -20,19 +26,20 @@ OVERPASS_URLS = [
 
 
 WALK_SPEED_MPS = 1.35  # ~4.9 km/h
+HULL_GRID_M = 50.0  # grid cell used to thin reachable nodes before the concave hull
 OVERPASS_DELAY_S = 1.1
+# Bump when graph building or edge costs change, so cached Dijkstra results are recomputed.
+REACH_CACHE_VERSION = 1
+# Optional local OSM extract (e.g. Geofabrik's armenia-latest.osm.pbf). When present and
+# pyrosm is installed, the walk network is read from it instead of queried from Overpass.
+WALK_PBF_PATH = Path("data/raw/armenia-latest.osm.pbf")
 
 
-def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    import math
-
-    r = 6371000.0
-    p1 = math.radians(lat1)
-    p2 = math.radians(lat2)
-    dp = p2 - p1
-    dl = math.radians(lon2 - lon1)
-    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
-    return 2 * r * math.asin(math.sqrt(a))
+def _simplify(geom, simplify_m: float):
+    """Drop vertices closer than ~simplify_m to the outline; the map can't show them anyway."""
+    if simplify_m <= 0:
+        return geom
+    return geom.simplify(simplify_m / 111_111.0, preserve_topology=True)
 
 
 def fetch_walking_isochrones_geojson_ors(
@@ -41,6 +48,7 @@ def fetch_walking_isochrones_geojson_ors(
     center_lat: float,
     center_lng: float,
     minutes: Iterable[int] = (15, 30, 45, 60),
+    simplify_m: float = 10.0,
 ) -> dict:
     ranges_s = [int(m) * 60 for m in minutes]
     body = {
@@ -57,7 +65,12 @@ def fetch_walking_isochrones_geojson_ors(
     }
     resp = requests.post(ORS_ISOCHRONES_URL, headers=headers, json=body, timeout=30)
     resp.raise_for_status()
-    return resp.json()
+    geojson = resp.json()
+    if simplify_m > 0:
+        for f in geojson.get("features", []):
+            if f.get("geometry"):
+                f["geometry"] = mapping(_simplify(shape(f["geometry"]), simplify_m))
+    return geojson
 
 
 def _post_overpass(query: str) -> dict:
@@ -76,7 +89,13 @@ def _post_overpass(query: str) -> dict:
             if resp.status_code in {502, 503, 504}:
                 raise requests.HTTPError(f"{resp.status_code} Server Error", response=resp)
             resp.raise_for_status()
-            return resp.json()
+            data = resp.json()
+            # Timeouts and out-of-memory aborts still come back as HTTP 200, with a remark and
+            # partial elements; a truncated walk network must not be cached.
+            remark = data.get("remark") or ""
+            if "runtime error" in remark:
+                raise RuntimeError(f"Overpass {remark}")
+            return data
         except Exception as e:
             last_err = e
             time.sleep(2.0)
@@ -101,9 +120,15 @@ def fetch_walk_network_overpass(
     center_lng: float,
     max_minutes: int,
     cache_path: Path,
-) -> dict:
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Walk-network ways as (offsets, latlon); see overpass_to_ways.
+
+    Cached as a compressed .npz of just those two arrays, not the raw Overpass JSON.
+    """
     if cache_path.exists():
-        return json.loads(cache_path.read_text(encoding="utf-8"))
+        with np.load(cache_path) as cached:
+            return cached["offsets"], cached["latlon"]
 
     print("  Isochrones: fetching walk network from Overpass...")
     south, west, north, east = _bbox_for_time(center_lat, center_lng, max_minutes)
@@ -116,91 +141,213 @@ def fetch_walk_network_overpass(
         '["access"!="private"]'
         ";out geom;"
     )
-    data = _post_overpass(query)
+    offsets, latlon = overpass_to_ways(_post_overpass(query))
     cache_path.parent.mkdir(parents=True, exist_ok=True)
-    cache_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-    return data
-
+    # Write then rename, so an interrupted run never leaves a corrupt .npz behind. Saving to an
+    # open file keeps numpy from appending its own .npz suffix to the .part name.
+    tmp = cache_path.with_name(cache_path.name + ".part")
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, offsets=offsets, latlon=latlon)
+    os.replace(tmp, cache_path)
+    return offsets, latlon
+
+
+def _flat_secs_vec(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray, cos_lat0: float
+) -> np.ndarray:
+    """
+    Element-wise walking time (seconds) between two sets of points, equirectangular.
 
-def build_graph_from_overpass(data: dict) -> tuple[dict[tuple[float, float], list[tuple[tuple[float, float], float]]], set[tuple[float, float]]]:
+    Street segments are tens of metres long inside a few-km bbox, where this matches
+    haversine to well under 0.1% with one hypot instead of five trig calls per edge.
     """
-    Build an undirected adjacency list: node -> [(neighbor, seconds), ...]
-    Nodes are lat/lng tuples rounded to 6 decimals to merge near-identical points.
+    k = 6371000.0 * np.pi / 180.0 / WALK_SPEED_MPS
+    dlon = np.subtract(lon2, lon1)
+    dlon *= cos_lat0
+    d = np.hypot(np.subtract(lat2, lat1), dlon, out=dlon)
+    d *= k
+    return d
+
+
+@dataclass(frozen=True)
+class WalkGraph:
+    # Undirected walk network in CSR form: the neighbours of node u are
+    # indices[indptr[u]:indptr[u + 1]], with edge times (seconds) in weights.
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    # (N, 2) lat/lng per node id, rounded to 6 decimals to merge near-identical points.
+    coords: np.ndarray
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.coords)
+
+
+def overpass_to_ways(data: dict) -> tuple[np.ndarray, np.ndarray]:
     """
-    adj: dict[tuple[float, float], list[tuple[tuple[float, float], float]]] = defaultdict(list)
-    nodes: set[tuple[float, float]] = set()
-
-    def norm(lat: float, lng: float) -> tuple[float, float]:
-        return (round(lat, 6), round(lng, 6))
+    Flatten Overpass ways (out geom) into (offsets, latlon).
 
+    latlon is an (P, 2) float array of every way vertex; way i is
+    latlon[offsets[i]:offsets[i + 1]]. Ways with fewer than 2 vertices are dropped.
+    """
+    ways = []
     for e in data.get("elements", []):
         if e.get("type") != "way":
             continue
         geom = e.get("geometry") or []
-        if len(geom) < 2:
-            continue
-        pts = [norm(float(p["lat"]), float(p["lon"])) for p in geom]
-        for a, b in zip(pts, pts[1:]):
-            if a == b:
-                continue
-            dist = _haversine_m(a[0], a[1], b[0], b[1])
-            secs = dist / WALK_SPEED_MPS
-            adj[a].append((b, secs))
-            adj[b].append((a, secs))
-            nodes.add(a)
-            nodes.add(b)
-
-    return adj, nodes
-
-
-def nearest_node(nodes: set[tuple[float, float]], lat: float, lng: float) -> tuple[float, float]:
-    best = None
-    best_d = float("inf")
-    for nlat, nlng in nodes:
-        d = _haversine_m(lat, lng, nlat, nlng)
-        if d < best_d:
-            best_d = d
-            best = (nlat, nlng)
-    if best is None:
+        if len(geom) >= 2:
+            ways.append(geom)
+
+    offsets = np.zeros(len(ways) + 1, dtype=np.int64)
+    np.cumsum([len(geom) for geom in ways], out=offsets[1:])
+    total = int(offsets[-1])
+    flat = np.fromiter(
+        (v for geom in ways for p in geom for v in (p["lat"], p["lon"])),
+        dtype=np.float64,
+        count=2 * total,
+    )
+    return offsets, flat.reshape(total, 2)
+
+
+def build_graph_from_ways(offsets: np.ndarray, latlon: np.ndarray) -> WalkGraph:
+    """Build the walk graph from flattened ways (see overpass_to_ways)."""
+    if len(offsets) < 2:
         raise RuntimeError("No nodes in walk network")
-    return best
-
-
-def dijkstra_times(
-    adj: dict[tuple[float, float], list[tuple[tuple[float, float], float]]],
-    source: tuple[float, float],
-    max_time_s: float,
-) -> dict[tuple[float, float], float]:
-    dist: dict[tuple[float, float], float] = {source: 0.0}
-    pq: list[tuple[float, tuple[float, float]]] = [(0.0, source)]
-    while pq:
-        t, u = heapq.heappop(pq)
-        if t != dist.get(u):
-            continue
-        if t > max_time_s:
-            continue
-        for v, w in adj.get(u, []):
-            nt = t + w
-            if nt > max_time_s:
-                continue
-            if nt < dist.get(v, float("inf")):
-                dist[v] = nt
-                heapq.heappush(pq, (nt, v))
-    return dist
+
+    # All way vertices in one (N, 2) array of integer microdegrees (i.e. rounded to
+    # 6 decimals); segment k joins point k to k+1 unless k is the last vertex of its way.
+    micro = np.rint(latlon * 1e6).astype(np.int64)
+    way_ends = offsets[1:] - 1
+    seg_ok = np.ones(len(micro) - 1, dtype=bool)
+    seg_ok[way_ends[:-1]] = False
+    seg_a = np.flatnonzero(seg_ok)
+    seg_b = seg_a + 1
+    moved = (micro[seg_a] != micro[seg_b]).any(axis=1)
+    seg_a, seg_b = seg_a[moved], seg_b[moved]
+    if len(seg_a) == 0:
+        raise RuntimeError("No nodes in walk network")
+
+    pts = micro / 1e6
+    cos_lat0 = float(np.cos(np.radians(pts[:, 0].mean())))
+    secs = _flat_secs_vec(pts[seg_a, 0], pts[seg_a, 1], pts[seg_b, 0], pts[seg_b, 1], cos_lat0)
+
+    # Node ids: pack each (lat, lng) pair into one int64 so identical points collapse
+    # with a 1-D unique (sorted by lat, then lng).
+    keys = ((micro[:, 0] + 90_000_000) << 32) | (micro[:, 1] + 180_000_000)
+    m = len(seg_a)
+    uniq, inv = np.unique(keys[np.concatenate((seg_a, seg_b))], return_inverse=True)
+    inv = inv.reshape(-1)
+    coords = np.column_stack(((uniq >> 32) - 90_000_000, (uniq & 0xFFFFFFFF) - 180_000_000)) / 1e6
+    return _walk_graph(coords, inv[:m], inv[m:], secs)
+
+
+def build_graph_from_pbf(pbf_path: Path, bbox: tuple[float, float, float, float]) -> WalkGraph:
+    """
+    Build the walk graph from a local .osm.pbf extract with pyrosm (optional dependency).
+
+    bbox is (south, west, north, east), as returned by _bbox_for_time.
+    """
+    import pyrosm
+
+    south, west, north, east = bbox
+    osm = pyrosm.OSM(str(pbf_path), bounding_box=[west, south, east, north])
+    nodes, edges = osm.get_network(network_type="walking", nodes=True)
+    if nodes is None or edges is None or len(edges) == 0:
+        raise RuntimeError("No nodes in walk network")
+
+    # Map OSM node ids on the edges to rows of the nodes table.
+    osm_ids = nodes["id"].to_numpy()
+    by_id = np.argsort(osm_ids)
+    u = by_id[np.searchsorted(osm_ids, edges["u"].to_numpy(), sorter=by_id)]
+    v = by_id[np.searchsorted(osm_ids, edges["v"].to_numpy(), sorter=by_id)]
+    secs = edges["length"].to_numpy(dtype=np.float64) / WALK_SPEED_MPS
+
+    # Keep only nodes that sit on an edge, renumbered 0..N-1.
+    m = len(u)
+    used, inv = np.unique(np.concatenate((u, v)), return_inverse=True)
+    inv = inv.reshape(-1)
+    coords = nodes[["lat", "lon"]].to_numpy(dtype=np.float64)[used]
+    return _walk_graph(coords, inv[:m], inv[m:], secs)
+
+
+def _walk_graph(coords: np.ndarray, a: np.ndarray, b: np.ndarray, secs: np.ndarray) -> WalkGraph:
+    """Undirected CSR graph from edge endpoints (node ids into coords) and edge times."""
+    src = np.concatenate((a, b))
+    dst = np.concatenate((b, a))
+    w = np.concatenate((secs, secs))
+
+    # Sort edges by (src, dst, weight) and keep the shortest of any parallel edges.
+    order = np.lexsort((w, dst, src))
+    src, dst, w = src[order], dst[order], w[order]
+    first = np.ones(len(src), dtype=bool)
+    first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+    src, dst, w = src[first], dst[first], w[first]
+
+    indptr = np.zeros(len(coords) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(src, minlength=len(coords)), out=indptr[1:])
+    return WalkGraph(indptr=indptr, indices=dst.astype(np.int32), weights=w, coords=coords)
+
+
+def _walk_pbf_path() -> Path | None:
+    """WALK_PBF_PATH if it exists and pyrosm is installed; otherwise None (use Overpass)."""
+    if not WALK_PBF_PATH.exists():
+        return None
+    try:
+        import pyrosm  # noqa: F401
+    except ImportError:
+        print(f"  Isochrones: {WALK_PBF_PATH} found but pyrosm is missing (pip install pyrosm); using Overpass")
+        return None
+    return WALK_PBF_PATH
+
+
+def _unit_xyz(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """Points on the unit sphere; Euclidean (chord) order matches great-circle order."""
+    p = np.radians(lat)
+    l = np.radians(lng)
+    cos_p = np.cos(p)
+    return np.column_stack((cos_p * np.cos(l), cos_p * np.sin(l), np.sin(p)))
+
+
+def build_node_index(coords: np.ndarray) -> cKDTree:
+    """KD-tree over (N, 2) lat/lng node coords; tree indices are node ids."""
+    return cKDTree(_unit_xyz(coords[:, 0], coords[:, 1]))
+
+
+def nearest_node(tree: cKDTree, lat: float, lng: float) -> int:
+    _, idx = tree.query(_unit_xyz(np.array([lat]), np.array([lng]))[0], k=1)
+    return int(idx)
+
+
+def dijkstra_times(graph: WalkGraph, source: int, max_time_s: float) -> np.ndarray:
+    """Walking seconds from source to every node id (np.inf beyond max_time_s)."""
+    n = graph.num_nodes
+    csr = csr_matrix((graph.weights, graph.indices, graph.indptr), shape=(n, n))
+    return dijkstra(csr, directed=True, indices=source, limit=max_time_s)
 
 
 def polygon_for_budget(
     *,
-    adj: dict[tuple[float, float], list[tuple[tuple[float, float], float]]],
-    times: dict[tuple[float, float], float],
+    coords: np.ndarray,
+    times: np.ndarray,
     budget_s: int,
     buffer_m: float = 70.0,
+    simplify_m: float = 10.0,
+    grid_m: float = HULL_GRID_M,
 ) -> dict:
     """Approximate isochrone polygon using concave hull of reachable nodes."""
-    pts = [(n[1], n[0]) for n, t in times.items() if t <= budget_s]  # (lng,lat)
+    pts = coords[times <= budget_s][:, ::-1]  # (lng,lat)
     if len(pts) < 3:
         return {"type": "Feature", "properties": {"value": budget_s}, "geometry": None}
 
+    # Thin to one node per ~grid_m cell before the hull: dense street graphs give
+    # GEOS far more points than the outline needs, and the buffer below hides the rest.
+    if grid_m > 0:
+        cells = np.floor(pts / (grid_m / 111_111.0)).astype(np.int64)
+        _, keep = np.unique(cells, axis=0, return_index=True)
+        if len(keep) >= 3:
+            pts = pts[np.sort(keep)]
+
     mp = MultiPoint(pts)
     # ratio in [0,1]; higher -> closer to convex hull, lower -> more concave.
     poly = shapely.concave_hull(mp, ratio=0.35, allow_holes=False)
@@ -209,6 +356,7 @@ def polygon_for_budget(
         poly = mp.convex_hull
     # small smoothing buffer (convert meters to degrees-ish)
     poly = poly.buffer(buffer_m / 111_111.0).buffer(0)
+    poly = _simplify(poly, simplify_m)
 
     return {
         "type": "Feature",
@@ -217,34 +365,109 @@ def polygon_for_budget(
     }
 
 
+def _reach_cache_path(
+    center_lat: float, center_lng: float, max_minutes: int, network_path: Path
+) -> Path | None:
+    """
+    Pickle path for Dijkstra results, next to the cached walk network.
+
+    Keyed on the centre, the largest budget, the network file's size/mtime, the walking
+    speed and REACH_CACHE_VERSION, so neither a re-fetched network nor a change to edge
+    costs ever reuses stale reachability.
+    """
+    if not network_path.exists():
+        return None
+    st = network_path.stat()
+    key = (
+        f"v{REACH_CACHE_VERSION}|{WALK_SPEED_MPS}|{round(center_lat, 4)}|{round(center_lng, 4)}|"
+        f"{max_minutes}|{st.st_size}|{st.st_mtime_ns}"
+    )
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return network_path.with_name(f"isochrones_{digest}.pkl")
+
+
+def _load_reach_cache(path: Path | None) -> dict | None:
+    if path is None or not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def _save_reach_cache(path: Path, payload: dict) -> None:
+    tmp = path.with_name(path.name + ".part")
+    with open(tmp, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(path)
+
+
 def generate_walk_isochrones_geojson_overpass(
     *,
     center_lat: float,
     center_lng: float,
     minutes: Iterable[int],
     cache_path: Path,
+    simplify_m: float = 10.0,
 ) -> dict:
     minutes_list = sorted({int(m) for m in minutes})
     max_minutes = max(minutes_list)
 
-    data = fetch_walk_network_overpass(
-        center_lat=center_lat,
-        center_lng=center_lng,
-        max_minutes=max_minutes,
-        cache_path=cache_path,
-    )
-    print("  Isochrones: building graph...")
-    adj, nodes = build_graph_from_overpass(data)
-    print(f"  Isochrones: graph nodes={len(nodes):,}")
-    src = nearest_node(nodes, center_lat, center_lng)
-    print("  Isochrones: running Dijkstra...")
-    times = dijkstra_times(adj, src, max_minutes * 60)
-    print(f"  Isochrones: reachable nodes={len(times):,} within {max_minutes} min")
-
+    # Reached nodes/times plus already-built polygons (by budget seconds and the
+    # polygon shaping parameters), reused across runs.
+    pbf_path = _walk_pbf_path()
+    network_path = pbf_path or cache_path
+    reach_cache = _reach_cache_path(center_lat, center_lng, max_minutes, network_path)
+    cached = _load_reach_cache(reach_cache)
+    dirty = cached is None
+    if cached is not None:
+        print(f"  Isochrones: using cached reachability ({len(cached['times']):,} nodes)")
+    else:
+        if pbf_path is not None:
+            print(f"  Isochrones: building graph from {pbf_path}...")
+            graph = build_graph_from_pbf(pbf_path, _bbox_for_time(center_lat, center_lng, max_minutes))
+        else:
+            offsets, latlon = fetch_walk_network_overpass(
+                center_lat=center_lat,
+                center_lng=center_lng,
+                max_minutes=max_minutes,
+                cache_path=cache_path,
+            )
+            print("  Isochrones: building graph...")
+            graph = build_graph_from_ways(offsets, latlon)
+        print(f"  Isochrones: graph nodes={graph.num_nodes:,}")
+        src = nearest_node(build_node_index(graph.coords), center_lat, center_lng)
+        print("  Isochrones: running Dijkstra...")
+        times = dijkstra_times(graph, src, max_minutes * 60)
+        # Dijkstra already stops at the largest budget; the per-budget polygons only
+        # need to scan the nodes it actually reached.
+        reached = np.isfinite(times)
+        cached = {"coords": graph.coords[reached], "times": times[reached], "polygons": {}}
+        print(f"  Isochrones: reachable nodes={len(cached['times']):,} within {max_minutes} min")
+        reach_cache = _reach_cache_path(center_lat, center_lng, max_minutes, network_path)
+
+    # Order reached nodes by time once; each budget is then a prefix slice (a view)
+    # found by binary search instead of a fresh mask over every node.
+    order = np.argsort(cached["times"], kind="stable")
+    sorted_coords = cached["coords"][order]
+    sorted_times = cached["times"][order]
+
+    polygons: dict[tuple[int, float, float], dict] = cached["polygons"]
     features = []
     for m in minutes_list:
-        print(f"  Isochrones: polygon {m} min...")
-        features.append(polygon_for_budget(adj=adj, times=times, budget_s=m * 60))
+        key = (m * 60, simplify_m, HULL_GRID_M)
+        if key not in polygons:
+            print(f"  Isochrones: polygon {m} min...")
+            k = int(np.searchsorted(sorted_times, m * 60, side="right"))
+            polygons[key] = polygon_for_budget(
+                coords=sorted_coords[:k], times=sorted_times[:k], budget_s=m * 60, simplify_m=simplify_m
+            )
+            dirty = True
+        features.append(polygons[key])
+
+    if dirty and reach_cache is not None:
+        _save_reach_cache(reach_cache, cached)
 
     return {"type": "FeatureCollection", "features": features}
 
@@ -275,11 +498,11 @@ def maybe_write_isochrones(
             api_key=api_key, center_lat=center_lat, center_lng=center_lng, minutes=minutes
         )
     else:
-        cache = Path("data/raw/overpass_walk_network.json")
+        cache = Path("data/raw/overpass_walk_network.npz")
         geojson = generate_walk_isochrones_geojson_overpass(
             center_lat=center_lat, center_lng=center_lng, minutes=minutes, cache_path=cache
         )
 
-    out_path.write_text(json.dumps(geojson, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(out_path, geojson, indent=False)
     return True
 
@@ -7,17 +7,22 @@ and generates CSV + GeoJSON. The interactive map UI is served
 as a static Vite frontend (see frontend/).
 """
 import json
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import shutil
 
+import numpy as np
+
 from scraper import run_scraper
 from scraper_kentron import run_kentron_scraper
 from scraper_listam import run_listam_scraper
-from geocode import in_district_bbox, run_geocoder
+from geocode import district_viewbox, run_geocoder
 from spread import run_spread
 from isochrones import maybe_write_isochrones
 from greens import write_greens_geojson
-from output import generate_csv, generate_geojson
+from output import generate_csv, generate_geojson, write_json
 
 
 def _reset_bad_geocodes_for_regen(listings: list[dict]) -> int:
@@ -31,51 +36,32 @@ def _reset_bad_geocodes_for_regen(listings: list[dict]) -> int:
     district bbox, the source site has wrong data; clear so our geocoder can fix.
     """
     protected = {"source_approx", "override", "address"}
-    cleared = 0
-    for l in listings:
-        prec = (l.get("geocode_precision") or "").strip()
-
-        if prec in protected:
-            continue
 
-        # source_map: validate against district bbox; Kentron sometimes embeds wrong coords
-        if prec == "source_map":
-            lat = l.get("lat")
-            lng = l.get("lng")
-            district = l.get("district") or ""
-            if lat is not None and lng is not None and district:
-                ok = in_district_bbox(lat, lng, district)
-                if ok is False:
-                    l["lat"] = None
-                    l["lng"] = None
-                    l["geocode_precision"] = None
-                    cleared += 1
-            continue
-
-        if prec in {"district", "district_jitter"}:
-            lat = l.get("lat")
-            lng = l.get("lng")
-            district = l.get("district") or ""
-            if lat is not None and lng is not None and district:
-                ok = in_district_bbox(lat, lng, district)
-                if ok is False:
-                    l["lat"] = None
-                    l["lng"] = None
-                    l["geocode_precision"] = None
-                    cleared += 1
+    # Every other precision (source_map, district / district_jitter, street-level) gets
+    # the same check. Bucket candidates by district so each bbox is looked up once and
+    # tested against all of its listings in one vectorized comparison.
+    # False positives (e.g. Vahagni's tight bbox) just cause an extra re-geocode,
+    # which is harmless.  False negatives (miss a wrong result) are the bigger risk.
+    by_district: dict[str, list[dict]] = defaultdict(list)
+    for l in listings:
+        if (l.get("geocode_precision") or "").strip() in protected:
             continue
-
-        lat = l.get("lat")
-        lng = l.get("lng")
         district = l.get("district") or ""
-        if lat is None or lng is None or not district:
+        if l.get("lat") is None or l.get("lng") is None or not district:
             continue
+        by_district[district].append(l)
 
-        # For street-level results, check against the district bbox.
-        # False positives (e.g. Vahagni's tight bbox) just cause an extra re-geocode,
-        # which is harmless.  False negatives (miss a wrong result) are the bigger risk.
-        ok = in_district_bbox(lat, lng, district)
-        if ok is False:
+    cleared = 0
+    for district, group in by_district.items():
+        vbox = district_viewbox(district)
+        if vbox is None:
+            continue
+        south, north, west, east = vbox
+        lats = np.fromiter((l["lat"] for l in group), dtype=float, count=len(group))
+        lngs = np.fromiter((l["lng"] for l in group), dtype=float, count=len(group))
+        inside = (lats >= south) & (lats <= north) & (lngs >= west) & (lngs <= east)
+        for i in np.flatnonzero(~inside):
+            l = group[i]
             l["lat"] = None
             l["lng"] = None
             l["geocode_precision"] = None
@@ -84,6 +70,35 @@ def _reset_bad_geocodes_for_regen(listings: list[dict]) -> int:
     return cleared
 
 
+def _merge_prev(l: dict, prev: dict) -> None:
+    """Fill AI review and geo fields on l from the previous run's listing, where l lacks them."""
+    # AI fields
+    prev_summary = prev.get("ai_summary")
+    if prev_summary and prev_summary.strip() and not (l.get("ai_summary") or "").strip():
+        l["ai_summary"] = prev_summary
+    prev_score = prev.get("ai_score")
+    if prev_score is not None and l.get("ai_score") is None:
+        l["ai_score"] = prev_score
+
+    # Geo fields (avoid re-geocoding)
+    takes_prev_coords = (
+        l.get("lat") is None and l.get("lng") is None and prev.get("lat") is not None and prev.get("lng") is not None
+    )
+    prev_lat = prev.get("lat")
+    if prev_lat is not None and l.get("lat") is None:
+        l["lat"] = prev_lat
+    prev_lng = prev.get("lng")
+    if prev_lng is not None and l.get("lng") is None:
+        l["lng"] = prev_lng
+    prev_precision = prev.get("geocode_precision")
+    if prev_precision and not l.get("geocode_precision"):
+        l["geocode_precision"] = prev_precision
+    # spread_count describes the previous run's spread coordinates, so it only travels with them;
+    # it lets run_spread skip streets that are already laid out.
+    if takes_prev_coords and prev.get("spread_count") is not None:
+        l["spread_count"] = prev["spread_count"]
+
+
 def main():
     print("=" * 60)
     print("  Yerevan Housing Rental Index Pipeline")
@@ -102,40 +117,29 @@ def main():
         except Exception:
             prev_by_id = {}
 
-    print("\n[1a/4] SCRAPING (besthouse.am)")
-    besthouse = run_scraper()
-
-    print("\n[1b/4] SCRAPING (real-estate.am / Kentron)")
-    kentron = run_kentron_scraper()
-
-    print("\n[1c/4] SCRAPING (list.am)")
-    listam = run_listam_scraper()
-
-    listings = besthouse + kentron + listam
+    # The three sites are independent and almost entirely network-bound, so scrape
+    # them concurrently. Progress lines interleave; most are already site-tagged.
+    print("\n[1/4] SCRAPING (besthouse.am, real-estate.am / Kentron, list.am)")
+    scrapers = {
+        "besthouse": run_scraper,
+        "kentron": run_kentron_scraper,
+        "listam": run_listam_scraper,
+    }
+    scraped: dict[str, list[dict]] = {}
+    with ThreadPoolExecutor(max_workers=len(scrapers)) as ex:
+        futures = {ex.submit(fn): name for name, fn in scrapers.items()}
+        for fut in as_completed(futures):
+            scraped[futures[fut]] = fut.result()
+            print(f"  [{futures[fut]}] done: {len(scraped[futures[fut]])} listings")
+
+    listings = scraped["besthouse"] + scraped["kentron"] + scraped["listam"]
 
     # Carry forward computed fields from the previous unified output (AI review + geo coords).
     if prev_by_id:
         for l in listings:
-            pid = l.get("id")
-            if not isinstance(pid, int):
-                continue
-            prev = prev_by_id.get(pid)
-            if not prev:
-                continue
-
-            # AI fields
-            if (not (l.get("ai_summary") or "").strip()) and (prev.get("ai_summary") or "").strip():
-                l["ai_summary"] = prev.get("ai_summary")
-            if l.get("ai_score") is None and prev.get("ai_score") is not None:
-                l["ai_score"] = prev.get("ai_score")
-
-            # Geo fields (avoid re-geocoding)
-            if l.get("lat") is None and prev.get("lat") is not None:
-                l["lat"] = prev.get("lat")
-            if l.get("lng") is None and prev.get("lng") is not None:
-                l["lng"] = prev.get("lng")
-            if (not l.get("geocode_precision")) and prev.get("geocode_precision"):
-                l["geocode_precision"] = prev.get("geocode_precision")
+            prev = prev_by_id.get(l.get("id"))
+            if prev:
+                _merge_prev(l, prev)
 
     reset_count = _reset_bad_geocodes_for_regen(listings)
     if reset_count:
@@ -155,8 +159,7 @@ def main():
 
     # Always persist the current listings (and spread coords) for the frontend to consume.
     listings_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(listings_path, "w", encoding="utf-8") as f:
-        json.dump(listings, f, indent=2, ensure_ascii=False)
+    write_json(listings_path, listings, indent=False)
 
     print("\n[4/4] GENERATING OUTPUTS")
     generate_csv(listings)
@@ -165,9 +168,15 @@ def main():
     # Copy data for the static frontend (GitHub Pages friendly).
     frontend_data_dir = Path("frontend/public/data")
     frontend_data_dir.mkdir(parents=True, exist_ok=True)
-    shutil.copyfile(listings_path, frontend_data_dir / "listings.json")
-    with open(frontend_data_dir / "config.json", "w", encoding="utf-8") as f:
-        json.dump({"eu": {"lat": eu_coords[0], "lng": eu_coords[1]}}, f, indent=2)
+    # Hardlink instead of copying the (multi-MB) listings file; fall back to a copy
+    # across filesystems or where links aren't supported.
+    frontend_listings = frontend_data_dir / "listings.json"
+    frontend_listings.unlink(missing_ok=True)
+    try:
+        os.link(listings_path, frontend_listings)
+    except OSError:
+        shutil.copyfile(listings_path, frontend_listings)
+    write_json(frontend_data_dir / "config.json", {"eu": {"lat": eu_coords[0], "lng": eu_coords[1]}})
 
     # Optional: generate walking isochrones (15/30 minutes).
     wrote_iso = maybe_write_isochrones(
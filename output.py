@@ -1,7 +1,9 @@
 import csv
-import json
+import os
 from pathlib import Path
 
+import orjson
+
 OUTPUT_DIR = Path("data/output")
 
 CSV_COLUMNS = [
@@ -32,34 +34,51 @@ CSV_COLUMNS = [
 ]
 
 
+def write_json(path: Path, obj, *, indent: bool = True) -> None:
+    """
+    Write obj as UTF-8 JSON, atomically: a crash mid-write leaves the previous file intact.
+
+    indent=True matches json.dump(indent=2, ensure_ascii=False); use indent=False for
+    machine-read payloads, where whitespace only adds bytes to write, copy and serve.
+    """
+    tmp = path.with_name(path.name + ".part")
+    tmp.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None))
+    os.replace(tmp, path)
+
+
+# Column positions filled in per row rather than copied from the listing.
+_ADDRESS_COL = CSV_COLUMNS.index("address")
+_MAPS_URL_COL = CSV_COLUMNS.index("maps_url")
+_LIST_COLS = [CSV_COLUMNS.index(c) for c in ("facilities", "amenities", "photo_urls")]
+
+
 def generate_csv(listings: list[dict]):
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     path = OUTPUT_DIR / "listings.csv"
 
+    # Only the CSV columns are pulled from each listing (no full-dict copy per row).
+    rows = []
+    for listing in listings:
+        row = [listing.get(c, "") for c in CSV_COLUMNS]
+
+        lat = listing.get("lat")
+        lng = listing.get("lng")
+        row[_MAPS_URL_COL] = f"https://www.google.com/maps?q={lat},{lng}" if lat and lng else ""
+
+        number = listing.get("parsed_address_number", "")
+        street = listing.get("street", "")
+        row[_ADDRESS_COL] = f"{number} {street}".strip() if number else street
+
+        for i in _LIST_COLS:
+            if isinstance(row[i], list):
+                row[i] = "; ".join(row[i])
+
+        rows.append(row)
+
     with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
-        writer.writeheader()
-        for listing in listings:
-            row = {**listing}
-            if row.get("lat") and row.get("lng"):
-                row["maps_url"] = (
-                    f"https://www.google.com/maps?q={row['lat']},{row['lng']}"
-                )
-            else:
-                row["maps_url"] = ""
-
-            number = row.get("parsed_address_number", "")
-            street = row.get("street", "")
-            row["address"] = f"{number} {street}".strip() if number else street
-
-            if isinstance(row.get("facilities"), list):
-                row["facilities"] = "; ".join(row["facilities"])
-            if isinstance(row.get("amenities"), list):
-                row["amenities"] = "; ".join(row["amenities"])
-            if isinstance(row.get("photo_urls"), list):
-                row["photo_urls"] = "; ".join(row["photo_urls"])
-
-            writer.writerow(row)
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(rows)
 
     print(f"  CSV saved to {path}")
 
@@ -89,8 +108,7 @@ def generate_geojson(listings: list[dict]):
         features.append(feature)
 
     collection = {"type": "FeatureCollection", "features": features}
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(collection, f, indent=2, ensure_ascii=False)
+    write_json(path, collection, indent=False)
 
     print(f"  GeoJSON saved to {path} ({len(features)} features)")
 
@@ -19,22 +19,70 @@ Usage:
 """
 
 import argparse
-import json
+import functools
 import os
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterable
 
+import orjson
 import requests
-
-NOMINATIM_DELAY = 1.1
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from output import write_json
+from review import check_photos, photo_urls, with_retries
+
+# Point NOMINATIM_URL at a self-hosted instance (and lower NOMINATIM_DELAY) to lift the
+# public server's 1 req/sec policy.
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org").rstrip("/")
+NOMINATIM_DELAY = float(os.environ.get("NOMINATIM_DELAY", "1.1"))
+NOMINATIM_TIMEOUT = float(os.environ.get("NOMINATIM_TIMEOUT", "15"))
+NOMINATIM_WORKERS = 4
 HEADERS_NOM = {"User-Agent": "YerevanRentals/1.0"}
 
+# Keep-alive session: one TLS handshake for the whole run instead of one per lookup.
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS_NOM)
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=NOMINATIM_WORKERS,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1.5,
+        status_forcelist=[429, 502, 503, 504],
+    ),
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+_RATE_LOCK = threading.Lock()
+_last_request_at = 0.0
+
+
+def _throttle():
+    """
+    Block until NOMINATIM_DELAY has passed since the previous request started.
+
+    The lock is held while sleeping, so concurrent workers queue up; with several in
+    flight the next request can start while the previous one is still on the wire.
+    """
+    global _last_request_at
+    with _RATE_LOCK:
+        wait = _last_request_at + NOMINATIM_DELAY - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request_at = time.monotonic()
+
 
 def reverse_geocode(lat: float, lng: float) -> dict:
-    time.sleep(NOMINATIM_DELAY)
-    resp = requests.get(
-        "https://nominatim.openstreetmap.org/reverse",
+    _throttle()
+    resp = _SESSION.get(
+        f"{NOMINATIM_URL}/reverse",
         params={
             "format": "json",
             "lat": lat,
@@ -43,10 +91,10 @@ def reverse_geocode(lat: float, lng: float) -> dict:
             "addressdetails": 1,
             "accept-language": "en",
         },
-        headers=HEADERS_NOM,
-        timeout=10,
+        timeout=NOMINATIM_TIMEOUT,
     )
-    data = resp.json()
+    resp.raise_for_status()
+    data = orjson.loads(resp.content)
     addr = data.get("address", {})
     return {
         "road": addr.get("road", ""),
@@ -66,12 +114,17 @@ _ABBREVIATIONS = {
 }
 
 
+# Whole-word suffixes only: a bare " st" replace also ate the start of "Stepanyan"
+# and turned "avenue" into "nue".
+_STREET_SUFFIX_RE = re.compile(r" (?:street|st|avenue|ave|alley|dead end|blind allay)\b")
+_STREET_PUNCT = str.maketrans({".": None, "-": " ", ",": " "})
+
+
+@functools.lru_cache(maxsize=4096)
 def _normalize_street(s: str) -> str:
     """Normalize street name for fuzzy matching."""
-    s = s.lower()
-    for suffix in [" street", " st", " ave", " avenue", " alley", " dead end", " blind allay"]:
-        s = s.replace(suffix, "")
-    s = s.replace(".", "").replace("-", " ").replace(",", " ").strip()
+    s = _STREET_SUFFIX_RE.sub("", s.lower())
+    s = s.translate(_STREET_PUNCT).strip()
     # Expand single-letter abbreviations
     parts = s.split()
     expanded = []
@@ -83,6 +136,7 @@ def _normalize_street(s: str) -> str:
     return " ".join(expanded)
 
 
+@functools.lru_cache(maxsize=4096)
 def _streets_match(listing_street: str, reverse_road: str) -> bool:
     a = _normalize_street(listing_street)
     b = _normalize_street(reverse_road)
@@ -98,70 +152,211 @@ def _streets_match(listing_street: str, reverse_road: str) -> bool:
     return len(overlap) > 0
 
 
+_HOUSE_NUMBER_RE = re.compile(r"(?:house|building|at|number|N\.?)\s*#?\s*(\d+)", re.I)
+_AI_ADDRESS_RE = re.compile(r"ADDRESS:\s*(.+?)(?:\n|$)", re.I)
+_DIGIT_RE = re.compile(r"\d")
+
+
+@functools.lru_cache(maxsize=512)
+def _description_patterns(street: str) -> tuple[re.Pattern, ...]:
+    """House-number patterns for a listing street, in priority order (compiled once per street)."""
+    norm = re.escape(_normalize_street(street))
+    patterns = [
+        re.compile(rf"(\d+)\s*{norm}", re.I),
+        re.compile(rf"{norm}\s*(\d+)", re.I),
+        _HOUSE_NUMBER_RE,
+    ]
+    if street:
+        patterns.append(re.compile(r"(\d+)\s*(?:,\s*)?{0}".format(re.escape(street.split()[0])), re.I))
+    return tuple(patterns)
+
+
 def _parse_description_for_number(desc: str, street: str) -> str | None:
     """Try to extract a house number from the description."""
-    if not desc:
+    # Every pattern captures a number, so a description without digits can't match.
+    if not desc or not _DIGIT_RE.search(desc):
         return None
-    patterns = [
-        re.compile(rf"(\d+)\s*{re.escape(_normalize_street(street))}", re.I),
-        re.compile(rf"{re.escape(_normalize_street(street))}\s*(\d+)", re.I),
-        re.compile(r"(?:house|building|at|number|N\.?)\s*#?\s*(\d+)", re.I),
-        re.compile(r"(\d+)\s*(?:,\s*)?{0}".format(re.escape(street.split()[0])), re.I) if street else None,
-    ]
-    for pat in patterns:
-        if pat is None:
-            continue
+    for pat in _description_patterns(street):
         m = pat.search(desc)
         if m:
             return m.group(1)
     return None
 
 
-def resolve_listing(
-    listing: dict,
-    kentron_by_street: dict[str, list[dict]],
-    rev_cache: dict[int, dict],
-    ai_client=None,
-) -> dict:
+@dataclass(frozen=True)
+class KentronIndex:
+    # Kentron listings by normalized street, and by each significant (len > 2) street word.
+    by_street: dict[str, list[dict]]
+    by_word: dict[str, list[dict]]
+
+
+def build_kentron_index(listings: Iterable[dict]) -> KentronIndex:
+    """Index the Kentron listings among listings in one pass (other sources are skipped)."""
+    by_street: dict[str, list[dict]] = {}
+    by_word: dict[str, list[dict]] = {}
+    for k in listings:
+        if k.get("source") != "kentron":
+            continue
+        key = _normalize_street(k.get("street") or "")
+        if not key:
+            continue
+        by_street.setdefault(key, []).append(k)
+        for w in dict.fromkeys(key.split()):
+            if len(w) > 2:
+                by_word.setdefault(w, []).append(k)
+    return KentronIndex(by_street=by_street, by_word=by_word)
+
+
+def _kentron_matches(street: str, index: KentronIndex) -> list[dict]:
     """
-    Resolve the address for one listing. Returns dict with
-    address, confidence, source fields.
+    Kentron listings whose street matches the listing's (same rules as _streets_match).
+
+    Token-overlap matches come from the word posting lists; substring matches only need
+    a scan over the distinct Kentron street names, not every Kentron listing.
     """
-    lid = listing["id"]
-    street = listing.get("street") or ""
-    district = (listing.get("district") or "").lower().strip()
-    lat, lng = listing.get("lat"), listing.get("lng")
-    desc = (listing.get("description") or "").strip()
+    key = _normalize_street(street)
+    if not key:
+        return []
+    found: dict[int, dict] = {}
+    for other, group in index.by_street.items():
+        if key in other or other in key:
+            for k in group:
+                found.setdefault(id(k), k)
+    for w in dict.fromkeys(key.split()):
+        if len(w) > 2:
+            for k in index.by_word.get(w, []):
+                found.setdefault(id(k), k)
+    return list(found.values())
 
-    candidates: list[dict] = []
 
-    # --- Signal 1: Cross-reference with Kentron (precise Yandex coords) ---
-    street_key = _normalize_street(street)
-    kentron_matches = kentron_by_street.get(street_key, [])
-    for km in kentron_matches:
+CoordKey = tuple[float, float]
+
+
+def _coord_key(lat: float, lng: float) -> CoordKey:
+    """rev_cache key: coordinates rounded to 6 decimals (~11 cm)."""
+    return (round(float(lat), 6), round(float(lng), 6))
+
+
+def reverse_geocode_cached(lat: float, lng: float, rev_cache: dict[CoordKey, dict]) -> dict:
+    """reverse_geocode, answered from rev_cache when the same spot was looked up before."""
+    key = _coord_key(lat, lng)
+    if key not in rev_cache:
+        try:
+            rev_cache[key] = reverse_geocode(lat, lng)
+        except (requests.RequestException, orjson.JSONDecodeError) as e:
+            # Left uncached so the next run retries it; this listing just loses the signal.
+            print(f"  Reverse geocode failed for {key}: {e}")
+            return {}
+    return rev_cache[key]
+
+
+def _kentron_coords(listing: dict, kentron_index: KentronIndex) -> list[tuple[dict, float, float]]:
+    """(kentron listing, lat, lng) for every map-precise Kentron cross-ref of listing's street."""
+    out: list[tuple[dict, float, float]] = []
+    for km in _kentron_matches(listing.get("street") or "", kentron_index):
         if km.get("geocode_precision") != "source_map":
             continue
         km_lat, km_lng = km.get("lat"), km.get("lng")
-        if not km_lat or not km_lng:
-            continue
-        cache_key = f"kentron_{km['id']}"
-        if cache_key not in rev_cache:
+        if km_lat and km_lng:
+            out.append((km, km_lat, km_lng))
+    return out
+
+
+def _kentron_candidates(
+    listing: dict, kentron_index: KentronIndex, rev_cache: dict[CoordKey, dict]
+) -> list[dict]:
+    """Signal 1: Kentron cross-refs whose reverse geocode lands on the listing's street."""
+    street = listing.get("street") or ""
+    candidates: list[dict] = []
+    for km, km_lat, km_lng in _kentron_coords(listing, kentron_index):
+        if _coord_key(km_lat, km_lng) not in rev_cache:
             print(f"  Reverse-geocoding Kentron #{km['id']} coords...")
-            rev_cache[cache_key] = reverse_geocode(km_lat, km_lng)
-        rev = rev_cache[cache_key]
+        rev = reverse_geocode_cached(km_lat, km_lng, rev_cache)
         if rev.get("house_number") and _streets_match(street, rev.get("road", "")):
             candidates.append({
                 "address": f"{rev['house_number']} {rev['road']}",
                 "confidence": "HIGH",
                 "source": f"Kentron cross-ref #{km['id']} reverse geocode ({rev['display_name'][:80]})",
             })
+    return candidates
+
+
+def _has_high(candidates: list[dict]) -> bool:
+    return any(c["confidence"] == "HIGH" for c in candidates)
+
+
+def _reverse_geocode_batch(coords: Iterable[tuple[float, float]], rev_cache: dict[CoordKey, dict]) -> None:
+    jobs: dict[CoordKey, tuple[float, float]] = {}
+    for lat, lng in coords:
+        key = _coord_key(lat, lng)
+        if key not in rev_cache:
+            jobs.setdefault(key, (lat, lng))
+    if not jobs:
+        return
+
+    print(f"Reverse-geocoding {len(jobs)} uncached coordinates...")
+    with ThreadPoolExecutor(max_workers=NOMINATIM_WORKERS) as ex:
+        futures = {ex.submit(reverse_geocode, lat, lng): key for key, (lat, lng) in jobs.items()}
+        for fut in as_completed(futures):
+            key = futures[fut]
+            try:
+                rev_cache[key] = fut.result()
+            except (requests.RequestException, orjson.JSONDecodeError) as e:
+                # Left out of the cache, so it is retried next run; lookups already made are kept.
+                print(f"  Reverse geocode failed for {key}: {e}")
+
+
+def prefill_reverse_cache(
+    targets: list[dict], kentron_index: KentronIndex, rev_cache: dict[CoordKey, dict]
+) -> None:
+    """
+    Reverse-geocode every uncached coordinate the targets need, before resolving.
+
+    Requests go through a small pool behind the shared throttle, so network latency
+    overlaps the rate-limit wait instead of adding to it. Kentron cross-refs go first:
+    listings they already resolve with HIGH confidence never need their own lookup.
+    """
+    _reverse_geocode_batch(
+        ((lat, lng) for listing in targets for _, lat, lng in _kentron_coords(listing, kentron_index)),
+        rev_cache,
+    )
+    _reverse_geocode_batch(
+        (
+            (listing["lat"], listing["lng"])
+            for listing in targets
+            if listing.get("lat") and listing.get("lng")
+            and not _has_high(_kentron_candidates(listing, kentron_index, rev_cache))
+        ),
+        rev_cache,
+    )
+
+
+def _signal_candidates(
+    listing: dict,
+    kentron_index: KentronIndex,
+    rev_cache: dict[CoordKey, dict],
+) -> tuple[list[dict], dict]:
+    """
+    Collect the data-only address candidates for one listing (Kentron
+    cross-ref, reverse geocode, description). Returns (candidates, rev).
+    """
+    street = listing.get("street") or ""
+    lat, lng = listing.get("lat"), listing.get("lng")
+    desc = (listing.get("description") or "").strip()
+
+    # --- Signal 1: Cross-reference with Kentron (precise Yandex coords) ---
+    candidates = _kentron_candidates(listing, kentron_index, rev_cache)
+
+    # Signals 2-3 can only add MEDIUM/LOW candidates once a HIGH exists; skip the lookup.
+    if _has_high(candidates):
+        return candidates, {}
 
     # --- Signal 2: Direct reverse geocode of listing coords ---
-    if lid not in rev_cache:
-        if lat and lng:
+    rev: dict = {}
+    if lat and lng:
+        if _coord_key(lat, lng) not in rev_cache:
             print(f"  Reverse-geocoding listing coords...")
-            rev_cache[lid] = reverse_geocode(lat, lng)
-    rev = rev_cache.get(lid, {})
+        rev = reverse_geocode_cached(lat, lng, rev_cache)
     if rev.get("house_number"):
         road_matches = _streets_match(street, rev.get("road", ""))
         if road_matches:
@@ -192,16 +387,43 @@ def resolve_listing(
             "source": f"Parsed from listing description",
         })
 
+    return candidates, rev
+
+
+def _ai_photos(listing: dict, candidates: list[dict]) -> list[str]:
+    """First 2 live photos for AI vision, or [] when a HIGH candidate already exists."""
+    if _has_high(candidates):
+        return []
+    return photo_urls(listing, max_images=2)
+
+
+def _add_ai_candidate(candidates: list[dict], ai_result: dict | None) -> None:
+    if ai_result and ai_result.get("address", "UNKNOWN") != "UNKNOWN":
+        candidates.append(ai_result)
+
+
+def resolve_listing(
+    listing: dict,
+    kentron_index: KentronIndex,
+    rev_cache: dict[CoordKey, dict],
+    ai_client=None,
+) -> dict:
+    """
+    Resolve the address for one listing. Returns dict with
+    address, confidence, source fields.
+    """
+    candidates, rev = _signal_candidates(listing, kentron_index, rev_cache)
+
     # --- Signal 4: AI vision on first 2 photos (only if we have an API client and no HIGH yet) ---
-    has_high = any(c["confidence"] == "HIGH" for c in candidates)
-    if ai_client and not has_high:
-        photos = (listing.get("photo_urls") or [])[:2]
+    if ai_client:
+        photos = _ai_photos(listing, candidates)
         if photos:
-            ai_result = _ai_resolve(listing, rev, photos, ai_client)
-            if ai_result and ai_result.get("address", "UNKNOWN") != "UNKNOWN":
-                candidates.append(ai_result)
+            _add_ai_candidate(candidates, _ai_resolve(listing, rev, photos, ai_client))
 
-    # --- Pick best candidate ---
+    return _pick_best(candidates)
+
+
+def _pick_best(candidates: list[dict]) -> dict:
     priority = {"HIGH": 3, "MEDIUM": 2, "LOW": 1}
     candidates.sort(key=lambda c: priority.get(c.get("confidence", "LOW"), 0), reverse=True)
 
@@ -237,29 +459,27 @@ Reply with ONLY: ADDRESS: <number street> or ADDRESS: UNKNOWN"""
         if url and isinstance(url, str):
             content.append({"type": "image_url", "image_url": {"url": url}})
 
-    for attempt in range(3):
-        try:
-            response = client.chat.completions.create(
+    try:
+        response = with_retries(
+            lambda: client.chat.completions.create(
                 model="gpt-4o",
                 messages=[{"role": "user", "content": content}],
                 max_tokens=100,
-            )
-            raw = (response.choices[0].message.content or "").strip()
-            m = re.search(r"ADDRESS:\s*(.+?)(?:\n|$)", raw, re.I)
-            addr = m.group(1).strip() if m else "UNKNOWN"
-            if addr.upper() == "UNKNOWN":
-                return None
-            return {
-                "address": addr,
-                "confidence": "MEDIUM",
-                "source": "AI vision identified from listing photos",
-            }
-        except Exception as e:
-            if "429" in str(e).lower():
-                time.sleep(10 * (attempt + 1))
-                continue
-            return None
-    return None
+            ),
+            attempts=3,
+        )
+    except Exception:
+        return None
+    raw = (response.choices[0].message.content or "").strip()
+    m = _AI_ADDRESS_RE.search(raw)
+    addr = m.group(1).strip() if m else "UNKNOWN"
+    if addr.upper() == "UNKNOWN":
+        return None
+    return {
+        "address": addr,
+        "confidence": "MEDIUM",
+        "source": "AI vision identified from listing photos",
+    }
 
 
 def main():
@@ -268,6 +488,7 @@ def main():
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--copy-frontend", action="store_true")
     parser.add_argument("--skip-ai", action="store_true", help="Skip AI vision (faster, data-only)")
+    parser.add_argument("--parallel", type=int, default=8, help="Concurrent AI vision calls")
     args = parser.parse_args()
 
     ai_client = None
@@ -280,34 +501,35 @@ def main():
         print("AI vision disabled (data-only mode)")
 
     listings_path = Path("data/listings.json")
-    listings = json.loads(listings_path.read_text(encoding="utf-8"))
-    favs = json.loads(Path("frontend/public/data/shortlist.json").read_text(encoding="utf-8"))
+    listings = orjson.loads(listings_path.read_bytes())
+    favs = orjson.loads(Path("frontend/public/data/shortlist.json").read_bytes())
 
     by_url = {l["url"]: l for l in listings}
     id_to_idx = {l["id"]: i for i, l in enumerate(listings)}
 
-    # Load reverse geocode cache (normalize legacy key names)
+    # Load reverse geocode cache, keyed by rounded coords (normalize legacy key names).
+    # Legacy entries were keyed by listing id only; re-key them by that listing's coords.
     rev_cache_path = Path("data/reverse_geocode_favs.json")
-    rev_cache: dict = {}
+    rev_cache: dict[CoordKey, dict] = {}
     if rev_cache_path.exists():
-        for item in json.loads(rev_cache_path.read_text()):
-            normalized = {
+        by_id = {l["id"]: l for l in listings}
+        for item in orjson.loads(rev_cache_path.read_bytes()):
+            lat, lng = item.get("lat"), item.get("lng")
+            if lat is None or lng is None:
+                owner = by_id.get(item.get("id", item.get("listing_id")))
+                if not owner or not owner.get("lat") or not owner.get("lng"):
+                    continue
+                lat, lng = owner["lat"], owner["lng"]
+            rev_cache[_coord_key(lat, lng)] = {
                 "road": item.get("road") or item.get("reverse_road", ""),
                 "house_number": item.get("house_number") or item.get("reverse_house_number", ""),
                 "display_name": item.get("display_name") or item.get("reverse_display", ""),
                 "suburb": item.get("suburb") or item.get("reverse_suburb", ""),
                 "postcode": item.get("postcode", ""),
-                "id": item.get("id"),
             }
-            rev_cache[item.get("id", item.get("listing_id"))] = normalized
 
     # Build Kentron cross-reference
-    kentron = [l for l in listings if l.get("source") == "kentron"]
-    kentron_by_street: dict[str, list[dict]] = {}
-    for k in kentron:
-        key = _normalize_street(k.get("street") or "")
-        if key:
-            kentron_by_street.setdefault(key, []).append(k)
+    kentron_index = build_kentron_index(listings)
 
     targets = []
     for url in favs:
@@ -319,21 +541,52 @@ def main():
         id_set = {int(x.strip()) for x in args.ids.split(",") if x.strip()}
         targets = [t for t in targets if t["id"] in id_set]
 
+    prefill_reverse_cache(targets, kentron_index, rev_cache)
+
+    # Pass 1: data-only signals (Nominatim results are already cached above).
+    signals = [_signal_candidates(l, kentron_index, rev_cache) for l in targets]
+
+    # Pass 2: AI vision for listings without a HIGH candidate, fanned out across listings.
+    if ai_client:
+        # Drop dead photo URLs first so a taken-down listing doesn't cost a model call.
+        check_photos(
+            [l for l, (candidates, _) in zip(targets, signals) if not _has_high(candidates)],
+            max_images=2,
+            download=False,
+        )
+        jobs = []
+        for i, (listing, (candidates, _)) in enumerate(zip(targets, signals)):
+            photos = _ai_photos(listing, candidates)
+            if photos:
+                jobs.append((i, photos))
+        if jobs:
+            workers = max(1, args.parallel)
+            print(f"AI vision for {len(jobs)} listings ({workers} workers)...")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(_ai_resolve, targets[i], signals[i][1], photos, ai_client): i
+                    for i, photos in jobs
+                }
+                for fut in as_completed(futures):
+                    _add_ai_candidate(signals[futures[fut]][0], fut.result())
+
     print(f"\nResolving addresses for {len(targets)} listings...\n")
 
+    # All network work is done by now; collect the report and write it in one go.
+    report: list[str] = []
     for i, listing in enumerate(targets, 1):
         lid = listing["id"]
         street = listing.get("street") or "?"
-        print(f"[{i}/{len(targets)}] id={lid} {street}")
+        report.append(f"[{i}/{len(targets)}] id={lid} {street}")
 
-        result = resolve_listing(listing, kentron_by_street, rev_cache, ai_client)
+        result = _pick_best(signals[i - 1][0])
 
         addr = result.get("resolved_address") or "UNKNOWN"
         conf = result.get("resolved_address_confidence", "LOW")
         src = result.get("resolved_address_source", "")
-        print(f"  -> {addr} ({conf})")
+        report.append(f"  -> {addr} ({conf})")
         if src:
-            print(f"     {src[:120]}")
+            report.append(f"     {src[:120]}")
 
         if not args.dry_run:
             idx = id_to_idx.get(lid)
@@ -341,10 +594,11 @@ def main():
                 listings[idx]["resolved_address"] = result.get("resolved_address")
                 listings[idx]["resolved_address_confidence"] = conf
                 listings[idx]["resolved_address_source"] = src[:300] if src else None
+    if report:
+        print("\n".join(report))
 
     if not args.dry_run:
-        with open(listings_path, "w", encoding="utf-8") as f:
-            json.dump(listings, f, indent=2, ensure_ascii=False)
+        write_json(listings_path, listings, indent=False)
         print(f"\nSaved to {listings_path}")
 
         if args.copy_frontend:
@@ -355,8 +609,7 @@ def main():
             print(f"Copied to {front}")
 
     # Save reverse geocode cache
-    with open(rev_cache_path, "w", encoding="utf-8") as f:
-        json.dump(list(rev_cache.values()), f, indent=2, ensure_ascii=False)
+    write_json(rev_cache_path, [{"lat": lat, "lng": lng, **rev} for (lat, lng), rev in rev_cache.items()])
 
 
 if __name__ == "__main__":
@@ -12,13 +12,22 @@ Requires OPENAI_API_KEY or ANTHROPIC_API_KEY. Skips listings that already have a
 """
 
 import argparse
-import json
+import base64
+import hashlib
 import os
+import random
 import re
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from output import write_json
+
 SYSTEM_PROMPT = """You are a blunt, observant real estate reviewer helping an American/European expat couple with an infant (planning to get a dog) evaluate rental homes in Yerevan, Armenia.
 
 Their priorities (in rough order):
@@ -44,6 +53,22 @@ Score guide:
 Be specific about what you SEE in the photos — mention actual details (tile color, yard size, kitchen style, views, fence type, furniture quality, red flags). Don't be generic. If something is a dealbreaker or a standout, say so plainly."""
 
 
+IMG_CACHE_DIR = Path("data/.img_cache")
+DEAD_URLS_PATH = Path("data/.dead_photo_urls.json")
+IMG_FETCH_WORKERS = 16
+
+# Photo URLs that answered 404/410, so they are never sent to a model.
+_DEAD_URLS: set[str] = set()
+
+
+def photo_urls(listing: dict, max_images: int | None = None) -> list[str]:
+    """The listing's photo URLs minus known-dead ones, capped at max_images."""
+    urls = [u for u in (listing.get("photo_urls") or []) if u and isinstance(u, str) and u not in _DEAD_URLS]
+    if max_images is not None:
+        urls = urls[:max_images]
+    return urls
+
+
 def build_user_content(listing: dict, max_images: int | None = None) -> list:
     """Build the 'content' array for the user message: one text part + one image part per photo URL."""
     facilities = listing.get("facilities") or []
@@ -53,10 +78,7 @@ def build_user_content(listing: dict, max_images: int | None = None) -> list:
     if isinstance(amenities, list):
         amenities = ", ".join(amenities)
     desc = (listing.get("description") or "").strip() or "(no description)"
-    urls = listing.get("photo_urls") or []
-    if max_images is not None:
-        urls = urls[:max_images]
-    urls = [u for u in urls if u and isinstance(u, str)]
+    urls = photo_urls(listing, max_images)
 
     text = f"""## Property: {listing.get('street') or '?'}, {listing.get('district') or '?'}
 - Price: ${listing.get('price_usd') or '?'}/mo
@@ -76,65 +98,249 @@ Review the following {len(urls)} photos of this property."""
     return content
 
 
+# Photo downloads for --inline-images; one pool shared by all fetch threads.
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": "Mozilla/5.0 (compatible; yerevan-real-estate/1.0)"})
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=IMG_FETCH_WORKERS,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+    ),
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+
+def _image_cache_path(url: str) -> Path:
+    return IMG_CACHE_DIR / hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def _media_type(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:3] == b"GIF":
+        return "image/gif"
+    return "image/jpeg"
+
+
+def fetch_image(url: str) -> bool | None:
+    """
+    Download url into the local image cache once. Returns True if it is cached,
+    False if the photo is gone (404/410) and None on any other failure.
+    """
+    p = _image_cache_path(url)
+    if p.exists():
+        return True
+    try:
+        resp = _SESSION.get(url, timeout=20)
+    except requests.RequestException:
+        return None
+    if resp.status_code in (404, 410):
+        return False
+    if not resp.ok:
+        return None
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".part")
+    tmp.write_bytes(resp.content)
+    tmp.replace(p)
+    return True
+
+
+def probe_image(url: str) -> bool | None:
+    """Like fetch_image, but a HEAD request only: True if alive, False if gone, None if unknown."""
+    if _image_cache_path(url).exists():
+        return True
+    try:
+        resp = _SESSION.head(url, timeout=5, allow_redirects=True)
+    except requests.RequestException:
+        return None
+    if resp.status_code in (404, 410):
+        return False
+    return True if resp.ok else None
+
+
+def check_photos(listings: list[dict], max_images: int | None = None, download: bool = True) -> None:
+    """
+    Probe every distinct photo URL of listings once (downloading it into the image cache
+    when download=True) and remember the dead ones, so photo_urls() drops them.
+    """
+    if not _DEAD_URLS and DEAD_URLS_PATH.exists():
+        _DEAD_URLS.update(orjson.loads(DEAD_URLS_PATH.read_bytes()))
+    urls = {u for listing in listings for u in photo_urls(listing, max_images)}
+    if not urls:
+        return
+    probe = fetch_image if download else probe_image
+    alive = gone = 0
+    with ThreadPoolExecutor(max_workers=IMG_FETCH_WORKERS) as ex:
+        for url, ok in zip(urls, ex.map(probe, urls)):
+            if ok is False:
+                _DEAD_URLS.add(url)
+                gone += 1
+            elif ok:
+                alive += 1
+    print(f"Photos: {alive}/{len(urls)} {'cached locally' if download else 'alive'}, {gone} gone")
+    if gone:
+        write_json(DEAD_URLS_PATH, sorted(_DEAD_URLS), indent=False)
+
+
+def _cached_image_b64(url: str) -> tuple[str, str] | None:
+    """(media_type, base64) for a cached photo, or None to fall back to the URL."""
+    p = _image_cache_path(url)
+    if not p.exists():
+        return None
+    data = p.read_bytes()
+    return _media_type(data), base64.b64encode(data).decode("ascii")
+
+
+def _inline_openai_images(content: list) -> list:
+    out = []
+    for part in content:
+        if part.get("type") == "image_url":
+            cached = _cached_image_b64(part["image_url"]["url"])
+            if cached:
+                media_type, b64 = cached
+                part = {"type": "image_url", "image_url": {"url": f"data:{media_type};base64,{b64}"}}
+        out.append(part)
+    return out
+
+
+def _inline_anthropic_images(blocks: list) -> list:
+    out = []
+    for block in blocks:
+        if block.get("type") == "image" and block["source"].get("type") == "url":
+            cached = _cached_image_b64(block["source"]["url"])
+            if cached:
+                media_type, b64 = cached
+                block = {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": b64}}
+        out.append(block)
+    return out
+
+
+_SCORE_RE = re.compile(r"SCORE:\s*(\d+)", re.IGNORECASE)
+_REVIEW_RE = re.compile(r"REVIEW:\s*(.+)", re.IGNORECASE | re.DOTALL)
+_RETRY_AFTER_RE = re.compile(r"try again in (\d+(?:\.\d+)?)\s*s", re.I)
+
+
 def parse_response(text: str) -> tuple[int | None, str]:
     """Extract SCORE (1-10) and REVIEW text from model output."""
     score = None
     summary = ""
-    score_m = re.search(r"SCORE:\s*(\d+)", text, re.IGNORECASE)
+    score_m = _SCORE_RE.search(text)
     if score_m:
         s = int(score_m.group(1))
         if 1 <= s <= 10:
             score = s
-    review_m = re.search(r"REVIEW:\s*(.+)", text, re.IGNORECASE | re.DOTALL)
+    review_m = _REVIEW_RE.search(text)
     if review_m:
         summary = review_m.group(1).strip()
     return score, summary
 
 
-def _parse_429_retry_seconds(err: Exception) -> int:
-    """Extract 'try again in X.XXs' from OpenAI 429 error message."""
-    msg = getattr(err, "message", str(err))
-    m = re.search(r"try again in (\d+(?:\.\d+)?)\s*s", msg, re.I)
+def _is_retryable(err: Exception) -> bool:
+    """Rate limits, 5xx and timeouts/connection drops are worth retrying; anything else is not."""
+    status = getattr(err, "status_code", None) or getattr(getattr(err, "response", None), "status_code", None)
+    if status == 429 or (isinstance(status, int) and status >= 500):
+        return True
+    msg = str(err).lower()
+    return "429" in msg or "rate_limit" in msg or "timed out" in msg or "connection error" in msg
+
+
+def _retry_delay(err: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retrying err: the server's Retry-After header, else its
+    "try again in X.XXs" hint, else exponential backoff with jitter (capped at 60s).
+    """
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(60.0, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    m = _RETRY_AFTER_RE.search(getattr(err, "message", str(err)))
     if m:
-        return max(5, int(float(m.group(1))) + 1)
-    return 20
+        return min(60.0, float(m.group(1)) + 0.5)
+    return min(60.0, 2**attempt + random.uniform(0, 1))
 
 
-def review_one_openai(listing: dict, client, max_images: int | None = None) -> dict:
-    """Call OpenAI vision model for one listing. Retries on 429 with backoff."""
-    content = build_user_content(listing, max_images=max_images)
-    last_err = None
-    for attempt in range(4):
+def with_retries(call, attempts: int = 4):
+    """Return call(), retrying rate-limit and transient API errors with server-driven backoff."""
+    for attempt in range(attempts):
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": content},
-                ],
-                max_tokens=400,
-            )
-            raw = (response.choices[0].message.content or "").strip()
-            score, summary = parse_response(raw)
-            out = dict(listing)
-            out["ai_score"] = score
-            out["ai_summary"] = summary
-            return out
+            return call()
         except Exception as e:
-            last_err = e
-            msg = str(e).lower()
-            is_429 = (
-                getattr(e, "code", None) == 429
-                or getattr(getattr(e, "response", None), "status_code", None) == 429
-                or "429" in msg
-                or "rate_limit" in msg
-            )
-            if is_429 and attempt < 3:
-                sec = _parse_429_retry_seconds(e)
-                time.sleep(sec)
-                continue
-            raise
-    raise last_err
+            if attempt == attempts - 1 or not _is_retryable(e):
+                raise
+            time.sleep(_retry_delay(e, attempt))
+
+
+AI_CACHE_PATH = Path("data/.ai_review_cache.json")
+
+
+def _ai_cache_key(model: str, content) -> str:
+    """Hash of everything that determines the model's answer: model, system prompt and content."""
+    payload = orjson.dumps({"model": model, "system": SYSTEM_PROMPT, "content": content}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def load_ai_cache(path: Path = AI_CACHE_PATH) -> dict[str, dict]:
+    if not path.exists():
+        return {}
+    try:
+        return orjson.loads(path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+
+def save_ai_cache(cache: dict[str, dict], path: Path = AI_CACHE_PATH) -> None:
+    """Merge cache into the file on disk and write it back."""
+    merged = load_ai_cache(path)
+    merged.update(cache)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_json(path, merged, indent=False)
+
+
+def _with_review(listing: dict, score: int | None, summary: str) -> dict:
+    out = dict(listing)
+    out["ai_score"] = score
+    out["ai_summary"] = summary
+    return out
+
+
+def review_one_openai(
+    listing: dict,
+    client,
+    max_images: int | None = None,
+    cache: dict[str, dict] | None = None,
+    inline_images: bool = False,
+) -> dict:
+    """Call OpenAI vision model for one listing. Retries rate limits and transient errors."""
+    content = build_user_content(listing, max_images=max_images)
+    key = _ai_cache_key("gpt-4o", content)
+    if cache is not None and key in cache:
+        return _with_review(listing, cache[key]["score"], cache[key]["summary"])
+    if inline_images:
+        content = _inline_openai_images(content)
+    response = with_retries(
+        lambda: client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": content},
+            ],
+            max_tokens=400,
+        )
+    )
+    raw = (response.choices[0].message.content or "").strip()
+    score, summary = parse_response(raw)
+    if cache is not None:
+        cache[key] = {"score": score, "summary": summary}
+    return _with_review(listing, score, summary)
 
 
 def build_anthropic_content(listing: dict, max_images: int | None = None) -> list:
@@ -146,10 +352,7 @@ def build_anthropic_content(listing: dict, max_images: int | None = None) -> lis
     if isinstance(amenities, list):
         amenities = ", ".join(amenities)
     desc = (listing.get("description") or "").strip() or "(no description)"
-    urls = listing.get("photo_urls") or []
-    if max_images is not None:
-        urls = urls[:max_images]
-    urls = [u for u in urls if u and isinstance(u, str)]
+    urls = photo_urls(listing, max_images)
     text = f"""## Property: {listing.get('street') or '?'}, {listing.get('district') or '?'}
 - Price: ${listing.get('price_usd') or '?'}/mo
 - Building area: {listing.get('building_area_sqm')} m² | Land: {listing.get('land_area_sqm')} m²
@@ -167,21 +370,58 @@ Review the following {len(urls)} photos of this property."""
     return blocks
 
 
-def review_one_anthropic(listing: dict, client, max_images: int | None = None) -> dict:
-    """Call Anthropic Claude vision model for one listing."""
+def review_one_anthropic(
+    listing: dict,
+    client,
+    max_images: int | None = None,
+    cache: dict[str, dict] | None = None,
+    inline_images: bool = False,
+) -> dict:
+    """Call Anthropic Claude vision model for one listing. Retries rate limits and transient errors."""
     content = build_anthropic_content(listing, max_images=max_images)
-    response = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=400,
-        system=SYSTEM_PROMPT,
-        messages=[{"role": "user", "content": content}],
+    model = "claude-3-5-sonnet-20241022"
+    key = _ai_cache_key(model, content)
+    if cache is not None and key in cache:
+        return _with_review(listing, cache[key]["score"], cache[key]["summary"])
+    if inline_images:
+        content = _inline_anthropic_images(content)
+    response = with_retries(
+        lambda: client.messages.create(
+            model=model,
+            max_tokens=400,
+            system=SYSTEM_PROMPT,
+            messages=[{"role": "user", "content": content}],
+        )
     )
     raw = (response.content[0].text if response.content else "").strip()
     score, summary = parse_response(raw)
-    out = dict(listing)
-    out["ai_score"] = score
-    out["ai_summary"] = summary
-    return out
+    if cache is not None:
+        cache[key] = {"score": score, "summary": summary}
+    return _with_review(listing, score, summary)
+
+
+def _progress_path(path: Path) -> Path:
+    """Append-only JSONL of listings reviewed since the last full save of path."""
+    return path.with_suffix(".partial.jsonl")
+
+
+def _apply_progress(listings: list, progress_path: Path) -> int:
+    """Overlay reviews logged by an interrupted run onto listings. Returns how many were applied."""
+    if not progress_path.exists():
+        return 0
+    id_to_index = {L["id"]: i for i, L in enumerate(listings) if isinstance(L, dict)}
+    applied = 0
+    with open(progress_path, "rb") as f:
+        for line in f:
+            try:
+                updated = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # torn last line from a killed run
+            idx = id_to_index.get(updated.get("id"))
+            if idx is not None:
+                listings[idx] = updated
+                applied += 1
+    return applied
 
 
 def main() -> None:
@@ -193,9 +433,18 @@ def main() -> None:
     parser.add_argument("--copy-frontend", action="store_true", help="Copy output to frontend/public/data/listings.json")
     parser.add_argument("--max-images", type=int, default=None, help="Cap images per listing (e.g. 12) to stay under token limits")
     parser.add_argument("--ids", type=str, default=None, help="Comma-separated listing IDs to review only (e.g. 10576,11038)")
+    parser.add_argument(
+        "--inline-images",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Download each distinct photo once and send it inline instead of by URL",
+    )
     parser.add_argument("--force", action="store_true", help="Re-run AI review even if listing already has ai_summary (use with --ids)")
     args = parser.parse_args()
 
+    # --force asks for a fresh answer, so skip cached responses (new ones are still stored).
+    ai_cache = {} if args.force else load_ai_cache()
+
     api_key = os.environ.get("OPENAI_API_KEY")
     anthropic_key = os.environ.get("ANTHROPIC_API_KEY")
     if api_key:
@@ -206,7 +455,7 @@ def main() -> None:
             raise SystemExit(1)
         client = OpenAI(api_key=api_key)
         max_im = getattr(args, "max_images", None)
-        run = lambda item: review_one_openai(item, client, max_images=max_im)
+        run = lambda item: review_one_openai(item, client, max_images=max_im, cache=ai_cache, inline_images=args.inline_images)
         print("Using OpenAI gpt-4o")
     elif anthropic_key:
         try:
@@ -216,7 +465,7 @@ def main() -> None:
             raise SystemExit(1)
         client = anthropic.Anthropic(api_key=anthropic_key)
         max_im = getattr(args, "max_images", None)
-        run = lambda item: review_one_anthropic(item, client, max_images=max_im)
+        run = lambda item: review_one_anthropic(item, client, max_images=max_im, cache=ai_cache, inline_images=args.inline_images)
         print("Using Anthropic Claude")
     else:
         print("Set OPENAI_API_KEY or ANTHROPIC_API_KEY and re-run.")
@@ -226,13 +475,17 @@ def main() -> None:
         print(f"File not found: {path}")
         raise SystemExit(1)
 
-    with open(path, "r", encoding="utf-8") as f:
-        listings = json.load(f)
+    listings = orjson.loads(path.read_bytes())
 
     if not isinstance(listings, list):
         print("Expected a JSON array of listings")
         raise SystemExit(1)
 
+    progress_path = _progress_path(path)
+    resumed = _apply_progress(listings, progress_path)
+    if resumed:
+        print(f"Resumed {resumed} reviews from {progress_path}")
+
     skip_done = args.skip_done and not getattr(args, "force", False)
     to_do = [
         L
@@ -251,47 +504,55 @@ def main() -> None:
         print("No listings to review (none left or already have ai_summary).")
         return
 
+    check_photos(to_do, max_images=max_im, download=args.inline_images)
+    # Listings whose photos have all been taken down are stale; don't pay for a review.
+    live = [L for L in to_do if photo_urls(L) or not L.get("photo_urls")]
+    if len(live) < total:
+        print(f"Skipping {total - len(live)} listings whose photos are all gone")
+        to_do, total = live, len(live)
+
     id_to_index = {L["id"]: i for i, L in enumerate(listings)}
     done = 0
-    save_every = 1
 
-    if args.parallel <= 1:
-        for i, listing in enumerate(to_do, 1):
-            print(f"[{i}/{total}] id={listing.get('id')} {listing.get('street') or '?'} ...")
-            try:
-                updated = run(listing)
-                idx = id_to_index.get(updated["id"])
-                if idx is not None:
-                    listings[idx] = updated
-                done += 1
-                if done % save_every == 0:
-                    with open(path, "w", encoding="utf-8") as f:
-                        json.dump(listings, f, indent=2, ensure_ascii=False)
-                    print(f"  -> score={updated.get('ai_score')} saved.")
-            except Exception as e:
-                print(f"  -> error: {e}")
-            time.sleep(0.5)
-    else:
-        with ThreadPoolExecutor(max_workers=args.parallel) as ex:
-            futures = {ex.submit(run, L): L for L in to_do}
-            for i, fut in enumerate(as_completed(futures), 1):
-                listing = futures[fut]
+    # Log each review as one JSONL line instead of rewriting the whole array per listing;
+    # the consolidated file is written once at the end.
+    with open(progress_path, "ab") as log:
+
+        def record(updated: dict) -> None:
+            idx = id_to_index.get(updated["id"])
+            if idx is not None:
+                listings[idx] = updated
+            log.write(orjson.dumps(updated) + b"\n")
+            log.flush()
+
+        if args.parallel <= 1:
+            for i, listing in enumerate(to_do, 1):
+                print(f"[{i}/{total}] id={listing.get('id')} {listing.get('street') or '?'} ...")
                 try:
-                    updated = fut.result()
-                    idx = id_to_index.get(updated["id"])
-                    if idx is not None:
-                        listings[idx] = updated
+                    updated = run(listing)
+                    record(updated)
                     done += 1
-                    print(f"[{i}/{total}] id={updated.get('id')} score={updated.get('ai_score')}")
-                    if done % save_every == 0:
-                        with open(path, "w", encoding="utf-8") as f:
-                            json.dump(listings, f, indent=2, ensure_ascii=False)
+                    print(f"  -> score={updated.get('ai_score')} saved.")
                 except Exception as e:
-                    print(f"[{i}/{total}] id={listing.get('id')} error: {e}")
-            time.sleep(0.1)
-
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(listings, f, indent=2, ensure_ascii=False)
+                    print(f"  -> error: {e}")
+                time.sleep(0.5)
+        else:
+            with ThreadPoolExecutor(max_workers=args.parallel) as ex:
+                futures = {ex.submit(run, L): L for L in to_do}
+                for i, fut in enumerate(as_completed(futures), 1):
+                    listing = futures[fut]
+                    try:
+                        updated = fut.result()
+                        record(updated)
+                        done += 1
+                        print(f"[{i}/{total}] id={updated.get('id')} score={updated.get('ai_score')}")
+                    except Exception as e:
+                        print(f"[{i}/{total}] id={listing.get('id')} error: {e}")
+                time.sleep(0.1)
+
+    save_ai_cache(ai_cache)
+    write_json(path, listings, indent=False)
+    progress_path.unlink(missing_ok=True)
     print(f"Done. Reviewed {done} listings, saved to {path}")
     if args.copy_frontend and path.resolve() != Path("frontend/public/data/listings.json").resolve():
         front = Path("frontend/public/data/listings.json")
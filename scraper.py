@@ -1,12 +1,20 @@
-import json
+import gzip
+import multiprocessing
 import os
 import re
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urljoin
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, NavigableString
+from lxml import html as lxml_html
+
+from output import write_json
 
 BASE_URL = "https://besthouse.am"
 SEARCH_BASE = (
@@ -32,70 +40,201 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 REQUEST_DELAY = 1.0
+FETCH_WORKERS = 4
+# Below this many pages, process start-up costs more than parallel parsing saves.
+PARSE_POOL_MIN = 16
+
+# Compiled once: parse_detail_page runs all of these on every cached page.
+_DETAIL_HREF_RE = re.compile(r"/rent-house-[^/]+/\d+$")
+_TRAILING_ID_RE = re.compile(r"/(\d+)$")
+_NEXT_RE = re.compile(r"Next")
+_PRICE_RE = re.compile(r"\$\s*([\d,]+)")
+_LOCATION_RE = re.compile(r"^Yerevan,\s*\w+")
+_TITLE_RE = re.compile(r"\d+\s+room\s+\w+,\s*(.+?),\s*(.+?)\s*\((\w+)\)")
+_ROOMS_RE = re.compile(r"(\d+)\s*ROOM")
+_LAND_RE = re.compile(r"land\s*-\s*(\d+)", re.I)
+_BUILDING_RE = re.compile(r"building\s*-\s*(\d+)", re.I)
+_HEIGHT_ITEM_RE = re.compile(r"^[\d.]+\s*m$")
+_HEIGHT_RE = re.compile(r"([\d.]+)\s*m")
+_FLOORS_ITEM_RE = re.compile(r"^\d+\+?$")
+_AREA_RE = re.compile(r"land\s*-\s*(\d+)\s*m\s*2?\s*,\s*building\s*-\s*(\d+)\s*m\s*2?", re.I)
+_BUILDING_TYPE_RE = re.compile(r"BUILDING\s*TYPE", re.I)
+_CONDITION_RE = re.compile(r"CONDITION", re.I)
+_FACILITIES_RE = re.compile(r"FACILITIES", re.I)
+_ADDITIONAL_INFO_RE = re.compile(r"ADDITIONAL\s*INFORMATION", re.I)
+_INFORMATION_RE = re.compile(r"^information$", re.I)
+_PHOTO_ORIGINAL_RE = re.compile(r'https?://objectstorage[^"\']+?/estates/\d+/images/original/([^"\'?\s]+)')
+_PHOTO_RE = re.compile(r'https?://objectstorage[^"\']+?/estates/\d+/images/([^"\'?\s]+)')
+# Text nodes parse_detail_page looks up by pattern; _find_strings collects them in one walk.
+_STRING_RES = {
+    "price": _PRICE_RE,
+    "location": _LOCATION_RE,
+    "building_type": _BUILDING_TYPE_RE,
+    "condition": _CONDITION_RE,
+    "facilities": _FACILITIES_RE,
+    "additional": _ADDITIONAL_INFO_RE,
+    "information": _INFORMATION_RE,
+}
+# Any-of gate over _STRING_RES, each pattern keeping its own flags: most text nodes fail
+# this one C-level search and never reach the per-key loop.
+_ANY_STRING_RE = re.compile("|".join(
+    f"(?i:{p.pattern})" if p.flags & re.I else f"(?:{p.pattern})" for p in _STRING_RES.values()
+))
+_ADDRESS_RES = (
+    re.compile(r"on\s+(\d+[\w]*)\s+([\w\s.'-]+?)(?:\s+(?:Street|St|street|str))", re.I),
+    re.compile(r"at\s+(\d+[\w]*)\s+([\w\s.'-]+?)(?:\s+(?:Street|St|street|str))", re.I),
+    re.compile(r"(\d+[\w]*)\s+([\w\s.'-]+?)(?:\s+(?:Street|St|street|str))[\s,.]", re.I),
+)
+
+
+# Keep-alive session: detail fetches reuse pooled connections instead of a new TLS
+# handshake per page. requests already negotiates gzip and decodes it into .text.
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_ADAPTER = HTTPAdapter(pool_connections=2, pool_maxsize=FETCH_WORKERS)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+_RATE_LOCK = threading.Lock()
+_last_request_at = 0.0
+
+
+def _throttle() -> None:
+    """Space request starts REQUEST_DELAY apart across all fetch threads."""
+    global _last_request_at
+    with _RATE_LOCK:
+        wait = _last_request_at + REQUEST_DELAY - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request_at = time.monotonic()
 
 
 def fetch_page(url: str, cache_name: str | None = None) -> str:
+    # Pages are cached gzipped (cache_name + ".gz"); plain caches from older runs still load.
     if cache_name:
+        gz_path = RAW_DIR / f"{cache_name}.gz"
+        if gz_path.exists():
+            try:
+                return gzip.decompress(gz_path.read_bytes()).decode("utf-8")
+            except (EOFError, gzip.BadGzipFile):
+                pass  # truncated by an interrupted run before writes were atomic; refetch
         cache_path = RAW_DIR / cache_name
         if cache_path.exists():
             return cache_path.read_text(encoding="utf-8")
 
-    time.sleep(REQUEST_DELAY)
-    resp = requests.get(url, headers=HEADERS, timeout=30)
+    _throttle()
+    resp = _SESSION.get(url, timeout=30)
     resp.raise_for_status()
     html = resp.text
 
     if cache_name:
-        cache_path = RAW_DIR / cache_name
-        cache_path.write_text(html, encoding="utf-8")
+        # Write then rename, so an interrupted run never leaves a truncated .gz behind.
+        gz_path = RAW_DIR / f"{cache_name}.gz"
+        tmp = gz_path.with_name(gz_path.name + ".part")
+        tmp.write_bytes(gzip.compress(html.encode("utf-8"), compresslevel=3))
+        os.replace(tmp, gz_path)
 
     return html
 
 
-def scrape_search_pages() -> list[int]:
-    """Scrape all search result pages for all districts, return list of listing IDs."""
-    all_ids = set()
-
-    for district_id, district_name in DISTRICTS.items():
-        search_url = f"{SEARCH_BASE}&estate_districts%5B%5D={district_id}"
-        page = 1
-        district_ids = set()
-
-        while True:
-            url = search_url if page == 1 else f"{search_url}&page={page}"
-            print(f"  [{district_name}] Fetching search page {page}...")
-            cache = f"search_{district_name.lower().replace('-','_')}_page_{page}.html"
-            html = fetch_page(url, cache_name=cache)
-            soup = BeautifulSoup(html, "html.parser")
-
-            links = soup.find_all("a", href=re.compile(r"/rent-house-[^/]+/\d+$"))
-            ids_on_page = set()
-            for link in links:
-                match = re.search(r"/(\d+)$", link["href"])
+def _walk_district(district_id: int, district_name: str) -> set[int]:
+    """Follow one district's search pagination until a page has no listings or no Next link."""
+    search_url = f"{SEARCH_BASE}&estate_districts%5B%5D={district_id}"
+    page = 1
+    district_ids = set()
+
+    while True:
+        url = search_url if page == 1 else f"{search_url}&page={page}"
+        print(f"  [{district_name}] Fetching search page {page}...")
+        cache = f"search_{district_name.lower().replace('-','_')}_page_{page}.html"
+        html = fetch_page(url, cache_name=cache)
+        # Only anchors matter on search pages: query lxml directly instead of building a soup.
+        anchors = lxml_html.fromstring(html).xpath("//a") if html.strip() else []
+
+        ids_on_page = set()
+        for a in anchors:
+            href = a.get("href") or ""
+            if _DETAIL_HREF_RE.search(href):
+                match = _TRAILING_ID_RE.search(href)
                 if match:
                     ids_on_page.add(int(match.group(1)))
 
-            if not ids_on_page:
-                break
+        if not ids_on_page:
+            break
 
-            district_ids.update(ids_on_page)
-            print(f"    Found {len(ids_on_page)} listings on page")
+        district_ids.update(ids_on_page)
+        print(f"    [{district_name}] Found {len(ids_on_page)} listings on page")
 
-            next_link = soup.find("a", string=re.compile(r"Next"))
-            if not next_link:
-                break
-            page += 1
+        next_link = any(_NEXT_RE.search(a.text_content()) for a in anchors)
+        if not next_link:
+            break
+        page += 1
+
+    return district_ids
 
-        new = district_ids - all_ids
-        all_ids.update(district_ids)
-        print(f"  [{district_name}] {len(district_ids)} total, {len(new)} new unique")
+
+def scrape_search_pages() -> list[int]:
+    """Scrape all search result pages for all districts, return list of listing IDs."""
+    all_ids = set()
+
+    # Districts are independent, so walk them concurrently; _throttle still spaces the requests.
+    # map() returns results in DISTRICTS order, keeping the per-district summary deterministic.
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        results = pool.map(_walk_district, DISTRICTS.keys(), DISTRICTS.values())
+        for district_name, district_ids in zip(DISTRICTS.values(), results):
+            new = district_ids - all_ids
+            all_ids.update(district_ids)
+            print(f"  [{district_name}] {len(district_ids)} total, {len(new)} new unique")
 
     return sorted(all_ids)
 
 
+def _find_strings(soup: BeautifulSoup) -> dict[str, list]:
+    """Text nodes matching each _STRING_RES pattern, in document order, from a single tree walk."""
+    found = {key: [] for key in _STRING_RES}
+    # Plain descendants walk: find_all(string=True) yields the same nodes but runs each
+    # one through a SoupStrainer first.
+    for text in soup.descendants:
+        if not isinstance(text, NavigableString) or not _ANY_STRING_RE.search(text):
+            continue
+        for key, pattern in _STRING_RES.items():
+            if pattern.search(text):
+                found[key].append(text)
+    return found
+
+
+def _strip_query(url: str) -> str:
+    """url without its query string."""
+    q = url.find("?")
+    return url if q == -1 else url[:q]
+
+
+def _nth_parent(node, k: int):
+    """Ancestor k levels above node, or None if the tree is not that deep."""
+    for _ in range(k):
+        node = node.parent
+        if node is None:
+            return None
+    return node
+
+
+def _section_items(headers: list, li_cache: dict[int, list[str]]) -> list[str] | None:
+    """Non-empty <li> texts in the container two levels above the first header, or None if no header."""
+    for header in headers:
+        container = _nth_parent(header, 2)
+        if container is not None:
+            key = id(container)
+            if key not in li_cache:
+                texts = (li.get_text(strip=True) for li in container.find_all("li"))
+                li_cache[key] = [t for t in texts if t]
+            return li_cache[key]
+    return None
+
+
 def parse_detail_page(listing_id: int, html: str) -> dict:
     """Parse a detail page HTML into a structured dict."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml")
+    strings = _find_strings(soup)
     data = {
         "id": listing_id,
         "url": f"{BASE_URL}/en/estates/{listing_id}",
@@ -105,15 +244,11 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
     title_tag = soup.find("title")
     data["title"] = title_tag.text.strip() if title_tag else ""
 
-    h1 = soup.find("h1")
-    if h1:
-        location_div = h1.find_next_sibling("div") or h1.find_next("div")
-
     price_text = ""
-    price_el = soup.find(string=re.compile(r"\$\s*[\d,]+"))
+    price_el = next(iter(strings["price"]), None)
     if price_el:
         price_text = price_el.strip()
-        match = re.search(r"\$\s*([\d,]+)", price_text)
+        match = _PRICE_RE.search(price_text)
         data["price_usd"] = int(match.group(1).replace(",", "")) if match else None
     else:
         data["price_usd"] = None
@@ -122,7 +257,7 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
     data["district"] = ""
     data["street"] = ""
 
-    loc_candidates = soup.find_all(string=re.compile(r"^Yerevan,\s*\w+"))
+    loc_candidates = strings["location"]
     for lc in loc_candidates:
         text = lc.strip()
         if len(text) < 80 and "," in text:
@@ -135,7 +270,7 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
 
     if not data["street"]:
         title_text = data.get("title", "")
-        match = re.match(r"\d+\s+room\s+\w+,\s*(.+?),\s*(.+?)\s*\((\w+)\)", title_text)
+        match = _TITLE_RE.match(title_text)
         if match:
             data["street"] = match.group(1).strip()
             data["district"] = match.group(2).strip()
@@ -162,21 +297,21 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
                 if len(items) >= 4 and any("ROOM" in it for it in items):
                     for item in items:
                         if "ROOM" in item:
-                            m = re.search(r"(\d+)\s*ROOM", item)
+                            m = _ROOMS_RE.search(item)
                             if m:
                                 data["rooms"] = int(m.group(1))
                         elif "land" in item.lower() or "building" in item.lower():
-                            lm = re.search(r"land\s*-\s*(\d+)", item, re.I)
-                            bm = re.search(r"building\s*-\s*(\d+)", item, re.I)
+                            lm = _LAND_RE.search(item)
+                            bm = _BUILDING_RE.search(item)
                             if lm:
                                 data["land_area_sqm"] = int(lm.group(1))
                             if bm:
                                 data["building_area_sqm"] = int(bm.group(1))
-                        elif re.match(r"^[\d.]+\s*m$", item):
-                            hm = re.search(r"([\d.]+)\s*m", item)
+                        elif _HEIGHT_ITEM_RE.match(item):
+                            hm = _HEIGHT_RE.search(item)
                             if hm:
                                 data["ceiling_height_m"] = float(hm.group(1))
-                        elif re.match(r"^\d+\+?$", item):
+                        elif _FLOORS_ITEM_RE.match(item):
                             val = item.rstrip("+")
                             num = int(val)
                             if data["rooms"] is not None and data["floors"] is None and num <= 10:
@@ -187,7 +322,7 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
                                 pass
                     if data["bathrooms"] is None:
                         for item in items:
-                            if re.match(r"^\d+\+?$", item) and item != str(data.get("floors")):
+                            if _FLOORS_ITEM_RE.match(item) and item != str(data.get("floors")):
                                 data["bathrooms"] = item
                                 break
                     break
@@ -195,20 +330,20 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
     all_text = soup.get_text()
 
     if data["building_area_sqm"] is None:
-        area_match = re.search(r"land\s*-\s*(\d+)\s*m\s*2?\s*,\s*building\s*-\s*(\d+)\s*m\s*2?", all_text, re.I)
+        area_match = _AREA_RE.search(all_text)
         if area_match:
             data["land_area_sqm"] = int(area_match.group(1))
             data["building_area_sqm"] = int(area_match.group(2))
 
     if data["rooms"] is None:
-        room_match = re.search(r"(\d+)\s*ROOM", all_text)
+        room_match = _ROOMS_RE.search(all_text)
         if room_match:
             data["rooms"] = int(room_match.group(1))
 
     building_type_patterns = ["New construction", "Monolith", "Stone", "Panel"]
     data["building_type"] = None
     for bt in building_type_patterns:
-        bt_section = soup.find(string=re.compile(r"BUILDING\s*TYPE", re.I))
+        bt_section = next(iter(strings["building_type"]), None)
         if bt_section:
             parent = bt_section.find_parent()
             if parent:
@@ -217,7 +352,7 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
                     data["building_type"] = next_el.get_text(strip=True)
                     break
 
-    condition_section = soup.find(string=re.compile(r"CONDITION", re.I))
+    condition_section = next(iter(strings["condition"]), None)
     data["condition"] = None
     if condition_section:
         parent = condition_section.find_parent()
@@ -228,39 +363,26 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
 
     data["facilities"] = []
     data["amenities"] = []
-    facility_headers = soup.find_all(string=re.compile(r"FACILITIES", re.I))
-    for fh in facility_headers:
-        parent = fh.find_parent()
-        if parent:
-            container = parent.find_parent()
-            if container:
-                items = container.find_all("li")
-                data["facilities"] = [item.get_text(strip=True) for item in items if item.get_text(strip=True)]
-                break
-
-    additional_headers = soup.find_all(string=re.compile(r"ADDITIONAL\s*INFORMATION", re.I))
-    for ah in additional_headers:
-        parent = ah.find_parent()
-        if parent:
-            container = parent.find_parent()
-            if container:
-                items = container.find_all("li")
-                data["amenities"] = [item.get_text(strip=True) for item in items if item.get_text(strip=True)]
-                break
+    # FACILITIES and ADDITIONAL INFORMATION can sit in the same container; collect its items once.
+    li_cache: dict[int, list[str]] = {}
+    facilities = _section_items(strings["facilities"], li_cache)
+    if facilities is not None:
+        data["facilities"] = list(facilities)
+    amenities = _section_items(strings["additional"], li_cache)
+    if amenities is not None:
+        data["amenities"] = list(amenities)
 
     data["description"] = ""
-    info_headers = soup.find_all(string=re.compile(r"^information$", re.I))
+    info_headers = strings["information"]
     for ih in info_headers:
-        parent = ih.find_parent()
-        if parent:
-            container = parent.find_parent()
-            if container:
-                paragraphs = container.find_all("p")
-                if paragraphs:
-                    data["description"] = " ".join(p.get_text(strip=True) for p in paragraphs)
-                elif container.find_next_sibling():
-                    data["description"] = container.find_next_sibling().get_text(strip=True)
-                break
+        container = _nth_parent(ih, 2)
+        if container is not None:
+            paragraphs = container.find_all("p")
+            if paragraphs:
+                data["description"] = " ".join(p.get_text(strip=True) for p in paragraphs)
+            elif container.find_next_sibling():
+                data["description"] = container.find_next_sibling().get_text(strip=True)
+            break
 
     if not data["description"]:
         meta_desc = soup.find("meta", attrs={"name": "description"})
@@ -268,34 +390,29 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
             data["description"] = meta_desc["content"]
 
     image_base = f"objectstorage.eu-stockholm-1.oraclecloud.com/n/axmal8d79xjn/b/besthouse-public-001-prod/o/estates/{listing_id}/images/original/"
-    photo_urls = []
-    seen_hashes = set()
-    for img_match in re.finditer(r'https?://objectstorage[^"\']+?/estates/\d+/images/original/([^"\'?\s]+)', html):
-        full_url = img_match.group(0).split("?")[0]
-        img_hash = img_match.group(1)
-        if img_hash not in seen_hashes:
-            seen_hashes.add(img_hash)
-            photo_urls.append(full_url)
-
-    if not photo_urls:
-        for img_match in re.finditer(r'https?://objectstorage[^"\']+?/estates/\d+/images/([^"\'?\s]+)', html):
-            full_url = img_match.group(0).split("?")[0]
-            filename = img_match.group(1)
-            if "original/" not in filename and filename not in seen_hashes:
-                seen_hashes.add(filename)
-                photo_urls.append(full_url)
-
+    # Keyed on image hash/filename: first URL wins, insertion order is page order.
+    photos: dict[str, str] = {}
+    # Both photo patterns need a literal "objectstorage" host; a substring check is far
+    # cheaper than letting the regexes scan a page without any.
+    if "objectstorage" in html:
+        for img_match in _PHOTO_ORIGINAL_RE.finditer(html):
+            img_hash = img_match.group(1)
+            if img_hash not in photos:
+                photos[img_hash] = _strip_query(img_match.group(0))
+
+        if not photos:
+            for img_match in _PHOTO_RE.finditer(html):
+                filename = img_match.group(1)
+                if "original/" not in filename and filename not in photos:
+                    photos[filename] = _strip_query(img_match.group(0))
+
+    photo_urls = list(photos.values())
     data["photo_urls"] = photo_urls
     data["photo_count"] = len(photo_urls)
 
-    address_patterns = [
-        re.compile(r"on\s+(\d+[\w]*)\s+([\w\s.'-]+?)(?:\s+(?:Street|St|street|str))", re.I),
-        re.compile(r"at\s+(\d+[\w]*)\s+([\w\s.'-]+?)(?:\s+(?:Street|St|street|str))", re.I),
-        re.compile(r"(\d+[\w]*)\s+([\w\s.'-]+?)(?:\s+(?:Street|St|street|str))[\s,.]", re.I),
-    ]
     data["parsed_address_number"] = None
     desc_text = data.get("description", "")
-    for pattern in address_patterns:
+    for pattern in _ADDRESS_RES:
         match = pattern.search(desc_text)
         if match:
             data["parsed_address_number"] = match.group(1)
@@ -306,17 +423,23 @@ def parse_detail_page(listing_id: int, html: str) -> dict:
 
 def scrape_all_details(listing_ids: list[int]) -> list[dict]:
     """Fetch and parse detail pages for all listing IDs."""
-    listings = []
     total = len(listing_ids)
-    for i, lid in enumerate(listing_ids, 1):
-        print(f"  [{i}/{total}] Fetching detail for listing #{lid}...")
-        html = fetch_page(
-            f"{BASE_URL}/en/estates/{lid}",
-            cache_name=f"detail_{lid}.html",
+    pages: list[str] = []
+    # Fetches overlap behind the shared throttle; map() keeps results in id order.
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        fetched = ex.map(
+            lambda lid: fetch_page(f"{BASE_URL}/en/estates/{lid}", cache_name=f"detail_{lid}.html"),
+            listing_ids,
         )
-        listing = parse_detail_page(lid, html)
-        listings.append(listing)
-    return listings
+        for i, (lid, html) in enumerate(zip(listing_ids, fetched), 1):
+            print(f"  [{i}/{total}] Fetched detail for listing #{lid}")
+            pages.append(html)
+
+    # Parsing is pure CPU; spread large batches (e.g. a re-parse of cached pages) over cores.
+    if total < PARSE_POOL_MIN:
+        return [parse_detail_page(lid, html) for lid, html in zip(listing_ids, pages)]
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(parse_detail_page, listing_ids, pages, chunksize=8))
 
 
 def run_scraper() -> list[dict]:
@@ -326,9 +449,8 @@ def run_scraper() -> list[dict]:
 
     existing = {}
     if output_path.exists():
-        with open(output_path, encoding="utf-8") as f:
-            for item in json.load(f):
-                existing[item["id"]] = item
+        for item in orjson.loads(output_path.read_bytes()):
+            existing[item["id"]] = item
         print(f"  Loaded {len(existing)} cached listings")
 
     print("  Scraping search results across all districts...")
@@ -347,8 +469,7 @@ def run_scraper() -> list[dict]:
     listings = [existing[lid] for lid in listing_ids if lid in existing]
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(listings, f, indent=2, ensure_ascii=False)
+    write_json(output_path, listings)
     print(f"\n  Saved {len(listings)} listings to {output_path}")
 
     return listings
@@ -1,11 +1,20 @@
-import json
+import gzip
+import multiprocessing
+import os
 import re
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urljoin
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+
+from output import write_json
 
 BASE_URL = "https://www.real-estate.am"
 SEARCH_URL = (
@@ -25,22 +34,91 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 REQUEST_DELAY = 1.0
+FETCH_WORKERS = 4
+# Below this many pages, process start-up costs more than parallel parsing saves.
+PARSE_POOL_MIN = 16
+
+# Compiled once: parse_detail_page runs all of these on every cached page.
+_DETAIL_HREF_RE = re.compile(r"^/en/prp/house/rent/.+/\d+$")
+_TRAILING_ID_RE = re.compile(r"/(\d+)$")
+_ADDRESS_COORDS_RE = re.compile(
+    r"address.{0,200}?latitude[^0-9]{0,50}([0-9]{2}\.[0-9]{4,}).{0,200}?longitude[^0-9]{0,50}([0-9]{2}\.[0-9]{4,})",
+    re.I | re.S,
+)
+# Cheap gate for _ADDRESS_COORDS_RE, whose lazy spans backtrack at every "address" on the page.
+_LATITUDE_RE = re.compile(r"latitude", re.I)
+_PHOTO_RE = re.compile(r"https?://s\.kentronrealty\.am/images/property/(?:SMALL|MEDIUM)/([^\"'\s>]+?\.webp)", re.I)
+# Every _extract_from_meta_description field in one alternation, so the string is scanned once.
+_META_FIELDS_RE = re.compile(
+    r"(?P<land_area_sqm>\d+(?:\.\d+)?)\s*sq\.m\s*land area"
+    r"|(?P<building_area_sqm>\d+(?:\.\d+)?)\s*sq\.m\s*house area"
+    r"|(?P<floors>\d+(?:\.\d+)?)\s*floor"
+    r"|(?P<bathrooms>\d+(?:\.\d+)?)\s*bathroom"
+    r"|\b(?P<condition>renovated|good condition|zero condition|new construction)\b",
+    re.I,
+)
+_META_ROOMS_RE = re.compile(r"(\d+)\s*room", re.I)
+_META_BUILDING_TYPE_RE = re.compile(r"\b(monolith|panel|stone|other)\b", re.I)
+# Meta-description condition phrases, in the order they take precedence.
+_META_CONDITIONS = {
+    "renovated": "Renovated",
+    "good condition": "Good condition",
+    "zero condition": "Zero condition",
+    "new construction": "New construction",
+}
+_H1_ROOMS_RE = re.compile(r"(\d+)\s*-\s*room", re.I)
+_PRICE_RE = re.compile(r"\$\s*([\d,]+)")
+_CEILING_RE = re.compile(r"\b(\d+(?:\.\d+)?)m\b")
+_BUILDING_TYPE_RE = re.compile(r"\b(Stone|Monolith|Panel|Other)\b")
+_CONDITION_RE = re.compile(r"\b(Renovated|Good condition|Zero condition|New construction)\b", re.I)
+
+
+# Keep-alive session: detail fetches reuse pooled connections instead of a new TLS
+# handshake per page. requests already negotiates gzip and decodes it into .text.
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_ADAPTER = HTTPAdapter(pool_connections=2, pool_maxsize=FETCH_WORKERS)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+_RATE_LOCK = threading.Lock()
+_last_request_at = 0.0
+
+
+def _throttle() -> None:
+    """Space request starts REQUEST_DELAY apart across all fetch threads."""
+    global _last_request_at
+    with _RATE_LOCK:
+        wait = _last_request_at + REQUEST_DELAY - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request_at = time.monotonic()
 
 
 def fetch_page(url: str, cache_name: str | None = None) -> str:
+    # Pages are cached gzipped (cache_name + ".gz"); plain caches from older runs still load.
     if cache_name:
+        gz_path = RAW_DIR / f"{cache_name}.gz"
+        if gz_path.exists():
+            try:
+                return gzip.decompress(gz_path.read_bytes()).decode("utf-8")
+            except (EOFError, gzip.BadGzipFile):
+                pass  # truncated by an interrupted run before writes were atomic; refetch
         cache_path = RAW_DIR / cache_name
         if cache_path.exists():
             return cache_path.read_text(encoding="utf-8")
 
-    time.sleep(REQUEST_DELAY)
-    resp = requests.get(url, headers=HEADERS, timeout=30)
+    _throttle()
+    resp = _SESSION.get(url, timeout=30)
     resp.raise_for_status()
     html = resp.text
 
     if cache_name:
-        cache_path = RAW_DIR / cache_name
-        cache_path.write_text(html, encoding="utf-8")
+        # Write then rename, so an interrupted run never leaves a truncated .gz behind.
+        gz_path = RAW_DIR / f"{cache_name}.gz"
+        tmp = gz_path.with_name(gz_path.name + ".part")
+        tmp.write_bytes(gzip.compress(html.encode("utf-8"), compresslevel=3))
+        os.replace(tmp, gz_path)
 
     return html
 
@@ -57,14 +135,12 @@ def scrape_search_pages() -> list[str]:
         cache = f"kentron_search_page_{page}.html"
         html = fetch_page(url, cache_name=cache)
 
-        soup = BeautifulSoup(html, "html.parser")
-        links = soup.find_all("a", href=re.compile(r"^/en/prp/house/rent/.+/\d+$"))
+        # Only anchor hrefs are needed here, so query lxml directly instead of building a soup.
+        hrefs = lxml_html.fromstring(html).xpath("//a/@href") if html.strip() else []
         page_urls = set()
-        for a in links:
-            href = a.get("href") or ""
-            if not href:
-                continue
-            page_urls.add(urljoin(BASE_URL, href))
+        for href in hrefs:
+            if href and _DETAIL_HREF_RE.search(href):
+                page_urls.add(urljoin(BASE_URL, href))
 
         if not page_urls:
             break
@@ -87,11 +163,9 @@ def _extract_address_coords(html: str) -> tuple[float | None, float | None]:
     # The page is a Next.js app and the coordinates live in an embedded JSON-ish payload.
     # Rather than matching exact backslash-escape sequences, we match the semantic shape:
     #   address ... latitude <number> ... longitude <number>
-    m = re.search(
-        r"address.{0,200}?latitude[^0-9]{0,50}([0-9]{2}\.[0-9]{4,}).{0,200}?longitude[^0-9]{0,50}([0-9]{2}\.[0-9]{4,})",
-        html,
-        flags=re.I | re.S,
-    )
+    if not _LATITUDE_RE.search(html):
+        return None, None
+    m = _ADDRESS_COORDS_RE.search(html)
     if not m:
         return None, None
     try:
@@ -106,11 +180,7 @@ def _extract_photos(html: str) -> list[str]:
     """
     urls: list[str] = []
     seen: set[str] = set()
-    for m in re.finditer(
-        r"https?://s\.kentronrealty\.am/images/property/(?:SMALL|MEDIUM)/([^\"'\s>]+?\.webp)",
-        html,
-        flags=re.I,
-    ):
+    for m in _PHOTO_RE.finditer(html):
         filename = m.group(1).rstrip("\\")
         if not filename or filename in seen:
             continue
@@ -125,42 +195,31 @@ def _extract_from_meta_description(meta_desc: str) -> dict:
       \"..., 900 sq.m land area, 400 sq.m house area, 3 floor, 3 bathroom, renovated.\"
     """
     out: dict = {}
+    conditions = set()
 
-    m = re.search(r"(\d+(?:\.\d+)?)\s*sq\.m\s*land area", meta_desc, re.I)
-    if m:
-        out["land_area_sqm"] = int(float(m.group(1)))
-
-    m = re.search(r"(\d+(?:\.\d+)?)\s*sq\.m\s*house area", meta_desc, re.I)
-    if m:
-        out["building_area_sqm"] = int(float(m.group(1)))
-
-    m = re.search(r"(\d+(?:\.\d+)?)\s*floor", meta_desc, re.I)
-    if m:
-        out["floors"] = int(float(m.group(1)))
-
-    m = re.search(r"(\d+(?:\.\d+)?)\s*bathroom", meta_desc, re.I)
-    if m:
-        out["bathrooms"] = int(float(m.group(1)))
+    # Numeric fields keep their first occurrence, as separate searches would.
+    for m in _META_FIELDS_RE.finditer(meta_desc):
+        field = m.lastgroup
+        if field == "condition":
+            conditions.add(m.group(field).lower())
+        elif field not in out:
+            out[field] = int(float(m.group(field)))
 
     # Condition is commonly present as the last adjective in this sentence.
     # Keep it simple: if we see specific known conditions, record them.
-    if re.search(r"\brenovated\b", meta_desc, re.I):
-        out["condition"] = "Renovated"
-    elif re.search(r"\bgood condition\b", meta_desc, re.I):
-        out["condition"] = "Good condition"
-    elif re.search(r"\bzero condition\b", meta_desc, re.I):
-        out["condition"] = "Zero condition"
-    elif re.search(r"\bnew construction\b", meta_desc, re.I):
-        out["condition"] = "New construction"
+    for phrase, label in _META_CONDITIONS.items():
+        if phrase in conditions:
+            out["condition"] = label
+            break
 
     return out
 
 
 def parse_detail_page(detail_url: str, html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml")
 
     # ID = numeric last segment in URL.
-    m = re.search(r"/(\d+)$", detail_url)
+    m = _TRAILING_ID_RE.search(detail_url)
     listing_id = int(m.group(1)) if m else None
 
     data: dict = {
@@ -199,7 +258,7 @@ def parse_detail_page(detail_url: str, html: str) -> dict:
     h1 = soup.find("h1")
     if h1:
         h1_text = h1.get_text(" ", strip=True)
-        rm = re.search(r"(\d+)\s*-\s*room", h1_text, re.I)
+        rm = _H1_ROOMS_RE.search(h1_text)
         if rm:
             data["rooms"] = int(rm.group(1))
 
@@ -215,9 +274,9 @@ def parse_detail_page(detail_url: str, html: str) -> dict:
             data["city"] = parts[2]
 
     # Price (USD).
-    price_el = soup.find(string=re.compile(r"\$\s*[\d,]+"))
+    price_el = soup.find(string=_PRICE_RE)
     if price_el:
-        pm = re.search(r"\$\s*([\d,]+)", str(price_el))
+        pm = _PRICE_RE.search(str(price_el))
         if pm:
             data["price_usd"] = int(pm.group(1).replace(",", ""))
 
@@ -229,17 +288,20 @@ def parse_detail_page(detail_url: str, html: str) -> dict:
 
         # Try to recover rooms if missing (\"7 room House for rent ...\").
         if data.get("rooms") is None:
-            rm = re.search(r"(\d+)\s*room", md, re.I)
+            rm = _META_ROOMS_RE.search(md)
             if rm:
                 data["rooms"] = int(rm.group(1))
 
         # Building type is sometimes present as \"Stone\" in the visible UI; parse conservatively from meta too.
-        bt = re.search(r"\b(monolith|panel|stone|other)\b", md, re.I)
+        bt = _META_BUILDING_TYPE_RE.search(md)
         if bt:
             data["building_type"] = bt.group(1).capitalize()
 
+    # One text pass serves the ceiling-height, building-type and condition scans below.
+    page_text = soup.get_text(" ", strip=True)
+
     # Ceiling height appears in visible UI as \"3.2m\" (not in meta description).
-    tm = re.search(r"\b(\d+(?:\.\d+)?)m\b", soup.get_text(" ", strip=True))
+    tm = _CEILING_RE.search(page_text)
     if tm:
         try:
             data["ceiling_height_m"] = float(tm.group(1))
@@ -248,13 +310,12 @@ def parse_detail_page(detail_url: str, html: str) -> dict:
 
     # Building type and condition appear as standalone words in the main text too.
     # Keep it conservative: only set if currently missing and match known tokens.
-    page_text = soup.get_text(" ", strip=True)
     if data.get("building_type") is None:
-        bt = re.search(r"\b(Stone|Monolith|Panel|Other)\b", page_text)
+        bt = _BUILDING_TYPE_RE.search(page_text)
         if bt:
             data["building_type"] = bt.group(1)
     if data.get("condition") is None:
-        cd = re.search(r"\b(Renovated|Good condition|Zero condition|New construction)\b", page_text, re.I)
+        cd = _CONDITION_RE.search(page_text)
         if cd:
             # Normalize casing to match site strings.
             data["condition"] = cd.group(1)[0].upper() + cd.group(1)[1:].lower()
@@ -279,17 +340,13 @@ def parse_detail_page(detail_url: str, html: str) -> dict:
             break
     if conv:
         section = conv.find_parent()
-        current: list[str] | None = None
+        # Sub-header -> output list; seen sets keep the de-duplication O(1) per token.
+        buckets = {"basic amenities": "facilities", "additional amenities": "amenities"}
+        seen = {key: set(data[key]) for key in buckets.values()}
+        current: str | None = None
         for node in section.find_all(["h3", "p", "span", "li"]):
             if node.name == "h3":
-                name = node.get_text(" ", strip=True).lower()
-                if name == "basic amenities":
-                    current = data["facilities"]
-                    continue
-                if name == "additional amenities":
-                    current = data["amenities"]
-                    continue
-                current = None
+                current = buckets.get(node.get_text(" ", strip=True).lower())
                 continue
 
             if current is None:
@@ -300,23 +357,35 @@ def parse_detail_page(detail_url: str, html: str) -> dict:
             # Keep only small leaf-like tokens.
             if len(t) > 60:
                 continue
-            if t not in current:
-                current.append(t)
+            if t not in seen[current]:
+                seen[current].add(t)
+                data[current].append(t)
 
     return data
 
 
 def scrape_all_details(detail_urls: list[str]) -> list[dict]:
-    out: list[dict] = []
     total = len(detail_urls)
-    for i, url in enumerate(detail_urls, 1):
-        m = re.search(r"/(\d+)$", url)
-        lid = m.group(1) if m else "unknown"
-        print(f"  [Kentron] [{i}/{total}] Fetching detail #{lid}...")
-        cache = f"kentron_detail_{lid}.html"
-        html = fetch_page(url, cache_name=cache)
-        out.append(parse_detail_page(url, html))
-    return out
+    lids = []
+    for url in detail_urls:
+        m = _TRAILING_ID_RE.search(url)
+        lids.append(m.group(1) if m else "unknown")
+    pages: list[str] = []
+    # Fetches overlap behind the shared throttle; map() keeps results in URL order.
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        fetched = ex.map(
+            lambda job: fetch_page(job[0], cache_name=f"kentron_detail_{job[1]}.html"),
+            zip(detail_urls, lids),
+        )
+        for i, (lid, html) in enumerate(zip(lids, fetched), 1):
+            print(f"  [Kentron] [{i}/{total}] Fetched detail #{lid}")
+            pages.append(html)
+
+    # Parsing is pure CPU; spread large batches over cores.
+    if total < PARSE_POOL_MIN:
+        return [parse_detail_page(url, html) for url, html in zip(detail_urls, pages)]
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(parse_detail_page, detail_urls, pages, chunksize=8))
 
 
 def run_kentron_scraper() -> list[dict]:
@@ -325,16 +394,15 @@ def run_kentron_scraper() -> list[dict]:
 
     existing: dict[int, dict] = {}
     if OUT_PATH.exists():
-        with open(OUT_PATH, encoding="utf-8") as f:
-            for item in json.load(f):
-                if isinstance(item, dict) and isinstance(item.get("id"), int):
-                    existing[item["id"]] = item
+        for item in orjson.loads(OUT_PATH.read_bytes()):
+            if isinstance(item, dict) and isinstance(item.get("id"), int):
+                existing[item["id"]] = item
         print(f"  Loaded {len(existing)} cached Kentron listings")
 
     detail_urls = scrape_search_pages()
     ids = []
     for url in detail_urls:
-        m = re.search(r"/(\d+)$", url)
+        m = _TRAILING_ID_RE.search(url)
         if m:
             ids.append(int(m.group(1)))
     ids_set = set(ids)
@@ -342,7 +410,7 @@ def run_kentron_scraper() -> list[dict]:
 
     new_urls: list[str] = []
     for u in detail_urls:
-        m = re.search(r"/(\d+)$", u)
+        m = _TRAILING_ID_RE.search(u)
         if not m:
             continue
         lid = int(m.group(1))
@@ -368,7 +436,7 @@ def run_kentron_scraper() -> list[dict]:
     # Preserve the stable ordering from the search pages.
     listings = []
     for url in detail_urls:
-        m = re.search(r"/(\d+)$", url)
+        m = _TRAILING_ID_RE.search(url)
         if not m:
             continue
         lid = int(m.group(1))
@@ -376,8 +444,7 @@ def run_kentron_scraper() -> list[dict]:
             listings.append(existing[lid])
 
     OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(OUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(listings, f, indent=2, ensure_ascii=False)
+    write_json(OUT_PATH, listings)
     print(f"\n  Saved {len(listings)} Kentron listings to {OUT_PATH}")
 
     return listings
@@ -1,19 +1,37 @@
-import json
+import functools
+import multiprocessing
+import os
+import queue
 import re
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
 
-from bs4 import BeautifulSoup
+import orjson
+from lxml import etree
+from lxml import html as lxml_html
 from playwright.sync_api import BrowserContext, Page, sync_playwright
 
+from output import write_json
+
 BASE_URL = "https://www.list.am"
 RAW_DIR = Path("data/raw")
 OUT_PATH = Path("data/listam_listings.json")
+# Cookies/local storage from the last run, so a fresh browser can reuse an already-passed Cloudflare check.
+STATE_PATH = RAW_DIR / "listam_state.json"
 
 # list.am is fronted by Cloudflare; use a real browser and be conservative.
 REQUEST_DELAY = 1.5
+# Search pages younger than this are parsed from data/raw instead of re-navigating.
+# Stale caches can hide new or reordered results, so keep the window short; LISTAM_FORCE_REFRESH=1 bypasses it.
+SEARCH_CACHE_TTL = float(os.environ.get("LISTAM_SEARCH_CACHE_TTL", "900"))
+# Detail pages load in this many browser pages at once; _throttle still spaces navigations REQUEST_DELAY apart.
+DETAIL_WORKERS = 4
+# Below this many pages, process start-up costs more than parallel parsing saves.
+PARSE_POOL_MIN = 16
 
 # Houses for rent category in Yerevan.
 # Use the exact query shape the user provided (URL-encoded commas).
@@ -34,10 +52,66 @@ DISTRICT_MAP = {
     "Nor Nork": "Nor Norq",
 }
 
+# Compiled once: the helpers below run these on every row and page.
+_INT_RE = re.compile(r"(\d+)")
+_FLOAT_RE = re.compile(r"(\d+(?:\.\d+)?)")
+# Bound search: the appliances token picker calls this once per row.
+_HAS_DIGIT = re.compile(r"\d").search
+# Bytes patterns: detail pages are scanned as raw cached bytes, never decoded to str.
+_PHOTO_RE = re.compile(rb"//s\.list\.am/f/\d+/\d+\.webp", re.I)
+_COORDS_RE = re.compile(rb'pl1\.init\("poiMap",\s*([0-9]{2}\.[0-9]+),\s*([0-9]{2}\.[0-9]+)', re.I)
+_CONVERTED_PRICE_RE = re.compile(r"\$\s*([\d,]+)\s*monthly", re.I)
+_DETAIL_ID_RE = re.compile(r"/(?:en/)?item/(\d+)$")
+_ITEM_HREF_RE = re.compile(r"/(?:en/)?item/(\d+)")
+
+
+def _has_class(name: str) -> str:
+    """XPath predicate matching one whitespace-separated class token, like CSS `.name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Cached pages are written as UTF-8; say so rather than let libxml2 guess from the bytes.
+_UTF8_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
+# Detail-page lookups, compiled once and evaluated against a single lxml tree per page.
+_XP_TEXT = etree.XPath(".//text()[not(parent::script or parent::style)]")
+_XP_DATE_POSTED = etree.XPath('(//span[@itemprop="datePosted"])[1]')
+_XP_FOOTER_SPANS = etree.XPath(f"(//div[{_has_class('footer')}])[1]//span")
+_XP_LOCATION_P = etree.XPath(f"(//div[{_has_class('post-location-title')}]//p)[1]")
+_XP_POI_ANCHOR = etree.XPath('(//*[@id="poi-map-anchor"])[1]')
+_XP_BORDERED_ROWS = etree.XPath(
+    f"(//div[{_has_class('attr')} and {_has_class('g')} and {_has_class('new')} and {_has_class('bordered')}])[1]"
+    f"//div[{_has_class('at2')}]"
+)
+_XP_AT2 = etree.XPath(f".//div[{_has_class('at2')}]")
+_XP_SECTION_HEADERS = etree.XPath(f"//div[{_has_class('gt')}]")
+_XP_NEXT_ELEMENT = etree.XPath("following-sibling::*[1]")
+_XP_BODY = etree.XPath(f"(.//div[{_has_class('body')}])[1]")
+_XP_TITLE = etree.XPath('(//h1[@itemprop="name"])[1]')
+_XP_PRICE = etree.XPath('(//span[@itemprop="price"])[1]')
+_XP_PRICE_CURRENCY = etree.XPath('(.//meta[@itemprop="priceCurrency"])[1]')
+_XP_PRICE_CONVERTED = etree.XPath(f"(//div[{_has_class('priceConverted')}])[1]")
+# Search-page lookups.
+_XP_SEARCH_LINKS = etree.XPath(f"//a[{_has_class('h')} and contains(@href, '/item/')]")
+_XP_CARD_DISTRICT = etree.XPath(f"(.//div[{_has_class('at')}])[1]")
+_XP_CARD_TITLE = etree.XPath(f"(.//div[{_has_class('l')}])[1]")
+_XP_PAGER_LINKS = etree.XPath(f"//span[{_has_class('pp')}]//a")
+
+
+class _SlugTable(dict):
+    """str.translate table: ASCII letters/digits map to themselves, every other code point to "_"."""
+
+    def __missing__(self, code: int) -> str:
+        return "_"
+
+
+_SLUG_TABLE = _SlugTable({ord(c): c for c in "abcdefghijklmnopqrstuvwxyz0123456789"})
+
 
 def _slug(s: str) -> str:
-    s = (s or "").strip().lower()
-    s = re.sub(r"[^a-z0-9]+", "_", s)
+    s = (s or "").strip().lower().translate(_SLUG_TABLE)
+    while "__" in s:
+        s = s.replace("__", "_")
     return s.strip("_") or "x"
 
 
@@ -47,46 +121,50 @@ def _canonical_listam_url(href: str) -> str:
       - keep scheme+host
       - drop query/fragment
     """
+    # Root-relative hrefs (nearly every search-card link) only need the query/fragment cut off.
+    if href.startswith("/") and not href.startswith("//"):
+        path = href.split("#", 1)[0].split("?", 1)[0]
+        # ";params" and dot segments still need urlparse/urljoin handling.
+        if ";" not in path and "/." not in path:
+            return f"{BASE_URL}{path}"
     full = urljoin(BASE_URL, href)
     p = urlparse(full)
     return f"{p.scheme}://{p.netloc}{p.path}"
 
 
 def _maybe_int(s: str) -> int | None:
-    m = re.search(r"(\d+)", s.replace(",", ""))
+    if "," in s:
+        s = s.replace(",", "")
+    m = _INT_RE.search(s)
     return int(m.group(1)) if m else None
 
 
 def _maybe_float(s: str) -> float | None:
-    m = re.search(r"(\d+(?:\.\d+)?)", s.replace(",", ""))
+    if "," in s:
+        s = s.replace(",", "")
+    m = _FLOAT_RE.search(s)
     return float(m.group(1)) if m else None
 
 
 def _dedupe_preserve_order(items: list[str]) -> list[str]:
-    seen: set[str] = set()
-    out: list[str] = []
-    for x in items:
-        if x in seen:
-            continue
-        seen.add(x)
-        out.append(x)
-    return out
+    return list(dict.fromkeys(items))
 
 
-def _extract_photo_urls(html: str) -> list[str]:
+def _extract_photo_urls(html: bytes) -> list[str]:
     # Full-size photos are present in the JS init block as protocol-relative URLs.
-    urls = re.findall(r"//s\.list\.am/f/\d+/\d+\.webp", html, flags=re.I)
-    urls = [f"https:{u}" for u in urls]
+    urls = _PHOTO_RE.findall(html)
+    urls = [f"https:{u.decode('ascii')}" for u in urls]
     return _dedupe_preserve_order(urls)
 
 
-def _extract_coords(html: str) -> tuple[float | None, float | None]:
+def _extract_coords(html: bytes) -> tuple[float | None, float | None]:
     # Approximate listing location is embedded in pl1.init("poiMap", LAT, LNG, ...).
-    m = re.search(
-        r'pl1\.init\("poiMap",\s*([0-9]{2}\.[0-9]+),\s*([0-9]{2}\.[0-9]+)',
-        html,
-        flags=re.I,
-    )
+    # Start the regex at the call when it appears in its usual casing instead of scanning the
+    # whole page case-insensitively; anything else falls back to the full search.
+    start = html.find(b'pl1.init("poiMap"')
+    m = _COORDS_RE.search(html, start) if start >= 0 else None
+    if not m:
+        m = _COORDS_RE.search(html)
     if not m:
         return None, None
     try:
@@ -95,26 +173,37 @@ def _extract_coords(html: str) -> tuple[float | None, float | None]:
         return None, None
 
 
-def _extract_dates(soup: BeautifulSoup) -> tuple[str | None, str | None]:
+def _first(xpath: etree.XPath, node):
+    found = xpath(node)
+    return found[0] if found else None
+
+
+def _text(node, sep: str = " ") -> str:
+    """Stripped, non-empty text nodes of `node` joined by `sep` (BeautifulSoup's get_text(sep, strip=True))."""
+    # Leaf elements (most attribute-cell <p>s) hold a single text node: skip the XPath walk.
+    if len(node) == 0 and node.tag not in ("script", "style"):
+        return (node.text or "").strip()
+    return sep.join(t for t in (s.strip() for s in _XP_TEXT(node)) if t)
+
+
+def _extract_dates(tree: lxml_html.HtmlElement) -> tuple[str | None, str | None]:
     listed_iso: str | None = None
     renewed: str | None = None
 
-    posted = soup.select_one('span[itemprop="datePosted"]')
-    if posted and posted.get("content"):
+    posted = _first(_XP_DATE_POSTED, tree)
+    if posted is not None and posted.get("content"):
         listed_iso = str(posted.get("content")).strip() or None
 
-    footer = soup.select_one("div.footer")
-    if footer:
-        for sp in footer.find_all("span"):
-            t = sp.get_text(" ", strip=True)
-            if t.lower().startswith("renewed "):
-                renewed = t[len("Renewed ") :].strip() or None
-                break
+    for sp in _XP_FOOTER_SPANS(tree):
+        t = _text(sp)
+        if t.lower().startswith("renewed "):
+            renewed = t[len("Renewed ") :].strip() or None
+            break
 
     return listed_iso, renewed
 
 
-def _extract_location(soup: BeautifulSoup) -> tuple[str, str]:
+def _extract_location(tree: lxml_html.HtmlElement) -> tuple[str, str]:
     """
     Returns (street, city).
 
@@ -123,11 +212,11 @@ def _extract_location(soup: BeautifulSoup) -> tuple[str, str]:
     city = "Yerevan"
     street = ""
 
-    p = soup.select_one("div.post-location-title p")
-    if not p:
-        p = soup.select_one("#poi-map-anchor")
-    if p:
-        loc = p.get_text(" ", strip=True)
+    p = _first(_XP_LOCATION_P, tree)
+    if p is None:
+        p = _first(_XP_POI_ANCHOR, tree)
+    if p is not None:
+        loc = _text(p)
         # Typically: "Tolstoy Street, Yerevan"
         parts = [x.strip() for x in loc.split(",") if x.strip()]
         if parts:
@@ -138,33 +227,35 @@ def _extract_location(soup: BeautifulSoup) -> tuple[str, str]:
     return street, city
 
 
-def _parse_bordered_metrics(soup: BeautifulSoup) -> dict:
+@functools.lru_cache(maxsize=256)
+def _bordered_field(label: str) -> str | None:
+    """Output field for a bordered-grid label; list.am repeats a handful of labels on every page."""
+    if "house area" in label:
+        return "building_area_sqm"
+    if "land area" in label:
+        return "land_area_sqm"
+    if "floors" in label:
+        return "floors"
+    if "number of rooms" in label or label.strip() == "rooms":
+        return "rooms"
+    if "number of bathrooms" in label or "bathrooms" in label:
+        return "bathrooms"
+    return None
+
+
+def _parse_bordered_metrics(tree: lxml_html.HtmlElement) -> dict:
     """
     Parses the bordered attribute grid (house area, land area, floors, rooms, bathrooms).
     """
     out: dict = {}
-    grid = soup.select_one("div.attr.g.new.bordered")
-    if not grid:
-        return out
-
-    for at2 in grid.select("div.at2"):
-        ps = at2.find_all("p")
+    for at2 in _XP_BORDERED_ROWS(tree):
+        ps = list(at2.iter("p"))
         if len(ps) < 2:
             continue
-        value = ps[0].get_text(" ", strip=True)
-        label = ps[-1].get_text(" ", strip=True).lower()
-
-        if "house area" in label:
-            out["building_area_sqm"] = _maybe_int(value)
-        elif "land area" in label:
-            out["land_area_sqm"] = _maybe_int(value)
-        elif "floors" in label:
-            out["floors"] = _maybe_int(value)
-        elif "number of rooms" in label or label.strip() == "rooms":
-            out["rooms"] = _maybe_int(value)
-        elif "number of bathrooms" in label or "bathrooms" in label:
-            # Bathrooms can be "3+"
-            out["bathrooms"] = _maybe_int(value)
+        field = _bordered_field(_text(ps[-1]).lower())
+        if field:
+            # Values like "3+" (bathrooms) keep their leading number.
+            out[field] = _maybe_int(_text(ps[0]))
 
     return out
 
@@ -178,13 +269,12 @@ def _parse_attr_section(section_el) -> list[dict]:
       - {"kind": "bool", "label": str, "enabled": bool}
     """
     items: list[dict] = []
-    if not section_el:
+    if section_el is None:
         return items
 
-    for at2 in section_el.select("div.at2"):
-        enabled = "disabled" not in (at2.get("class") or [])
-        ps = at2.find_all("p")
-        texts = [p.get_text(" ", strip=True) for p in ps if p.get_text(" ", strip=True)]
+    for at2 in _XP_AT2(section_el):
+        enabled = "disabled" not in (at2.get("class") or "").split()
+        texts = [t for t in (_text(p) for p in at2.iter("p")) if t]
         if not texts:
             continue
 
@@ -201,28 +291,25 @@ def _parse_attr_section(section_el) -> list[dict]:
     return items
 
 
-def _find_section(soup: BeautifulSoup, header: str):
-    hdr = None
-    for gt in soup.select("div.gt"):
-        t = gt.get_text(" ", strip=True).strip().lower()
-        if t == header.strip().lower():
-            hdr = gt
-            break
-    if not hdr:
-        return None
-    # The section content is usually the next sibling element.
-    nxt = hdr.find_next_sibling()
-    return nxt
+def _index_sections(tree: lxml_html.HtmlElement) -> dict:
+    """Lower-cased `div.gt` header text -> section content, from one pass over the headers."""
+    sections: dict = {}
+    for gt in _XP_SECTION_HEADERS(tree):
+        key = _text(gt).strip().lower()
+        if key not in sections:
+            # The section content is usually the next sibling element.
+            sections[key] = _first(_XP_NEXT_ELEMENT, gt)
+    return sections
 
 
-def _extract_price_usd(soup: BeautifulSoup) -> int | None:
-    price = soup.select_one('span[itemprop="price"]')
-    if not price:
+def _extract_price_usd(tree: lxml_html.HtmlElement) -> int | None:
+    price = _first(_XP_PRICE, tree)
+    if price is None:
         return None
     raw = price.get("content")
     currency = None
-    cur = price.select_one('meta[itemprop="priceCurrency"]')
-    if cur and cur.get("content"):
+    cur = _first(_XP_PRICE_CURRENCY, price)
+    if cur is not None and cur.get("content"):
         currency = str(cur.get("content")).strip().upper()
 
     if raw is None:
@@ -237,9 +324,9 @@ def _extract_price_usd(soup: BeautifulSoup) -> int | None:
         return amount
 
     # For non-USD listings, list.am shows a converted USD value in `.priceConverted`.
-    conv = soup.select_one("div.priceConverted")
-    if conv:
-        m = re.search(r"\$\s*([\d,]+)\s*monthly", conv.get_text(" ", strip=True), re.I)
+    conv = _first(_XP_PRICE_CONVERTED, tree)
+    if conv is not None:
+        m = _CONVERTED_PRICE_RE.search(_text(conv))
         if m:
             return int(m.group(1).replace(",", ""))
 
@@ -248,37 +335,42 @@ def _extract_price_usd(soup: BeautifulSoup) -> int | None:
 
 def parse_detail_page(
     detail_url: str,
-    html: str,
+    html: str | bytes,
     *,
     district_from_search: str,
 ) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    # Work on UTF-8 bytes (how pages are cached): lxml parses the buffer without a str round-trip.
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    tree = lxml_html.fromstring(html, parser=_UTF8_PARSER)
 
-    m = re.search(r"/(?:en/)?item/(\d+)$", detail_url)
+    m = _DETAIL_ID_RE.search(detail_url)
     listing_id = int(m.group(1)) if m else None
 
-    listed_date, renewed_date = _extract_dates(soup)
-    street, city = _extract_location(soup)
+    listed_date, renewed_date = _extract_dates(tree)
+    street, city = _extract_location(tree)
     photos = _extract_photo_urls(html)
     lat, lng = _extract_coords(html)
-    metrics = _parse_bordered_metrics(soup)
+    metrics = _parse_bordered_metrics(tree)
 
-    title_el = soup.select_one('h1[itemprop="name"]')
-    title = title_el.get_text(" ", strip=True) if title_el else ""
+    title_el = _first(_XP_TITLE, tree)
+    title = _text(title_el) if title_el is not None else ""
 
     # Description: under "Description" header, list.am uses `.body`.
     desc = ""
-    body = _find_section(soup, "Description")
-    if body:
+    sections = _index_sections(tree)
+    body = sections.get("description")
+    if body is not None:
         # Some pages use `div.body`, others use a plain container.
-        b = body.select_one("div.body") or body
-        desc = b.get_text("\n", strip=True)
+        b = _first(_XP_BODY, body)
+        desc = _text(b if b is not None else body, "\n")
 
-    facilities: list[str] = []
-    amenities: list[str] = []
+    # Insertion-ordered dicts used as sets: O(1) de-duplication, page order kept.
+    facilities: dict[str, None] = {}
+    amenities: dict[str, None] = {}
 
     # Appliances section: enabled tokens are facilities.
-    appliances = _find_section(soup, "Appliances")
+    appliances = sections.get("appliances")
     for item in _parse_attr_section(appliances):
         if not item.get("enabled"):
             continue
@@ -288,22 +380,22 @@ def parse_detail_page(
             a = (item.get("a") or "").strip()
             b = (item.get("b") or "").strip()
             # Prefer the label-like token.
-            token = b if b and not re.search(r"\d", b) else a
+            token = b if b and not _HAS_DIGIT(b) else a
             token = token.strip()
-        if token and token not in facilities:
-            facilities.append(token)
+        if token:
+            facilities[token] = None
 
     # House information: pick out construction type and renovation; everything else to amenities.
     building_type = None
     condition = None
-    house_info = _find_section(soup, "House Information")
+    house_info = sections.get("house information")
     for item in _parse_attr_section(house_info):
         if not item.get("enabled"):
             continue
         if item.get("kind") == "bool":
             lbl = (item.get("label") or "").strip()
-            if lbl and lbl not in amenities:
-                amenities.append(lbl)
+            if lbl:
+                amenities[lbl] = None
             continue
 
         a = (item.get("a") or "").strip()
@@ -331,12 +423,11 @@ def parse_detail_page(
             # Prefer "Label: Value" ordering.
             label, value = (a, b) if len(a) >= len(b) else (b, a)
             s = f"{label}: {value}"
-            if s not in amenities:
-                amenities.append(s)
+            amenities[s] = None
 
     # House rules and deal terms: store as amenities strings.
     for section_name in ("House Rules", "Deal Terms"):
-        sec = _find_section(soup, section_name)
+        sec = sections.get(section_name.lower())
         for item in _parse_attr_section(sec):
             if not item.get("enabled"):
                 continue
@@ -344,8 +435,7 @@ def parse_detail_page(
             b = (item.get("b") or "").strip()
             if a and b:
                 s = f"{section_name} - {b}: {a}"
-                if s not in amenities:
-                    amenities.append(s)
+                amenities[s] = None
 
     data: dict = {
         "id": listing_id,
@@ -355,7 +445,7 @@ def parse_detail_page(
         "district": district_from_search,
         "street": street,
         "title": title,
-        "price_usd": _extract_price_usd(soup),
+        "price_usd": _extract_price_usd(tree),
         "rooms": metrics.get("rooms"),
         "bathrooms": metrics.get("bathrooms"),
         "floors": metrics.get("floors"),
@@ -364,8 +454,8 @@ def parse_detail_page(
         "ceiling_height_m": None,
         "building_type": building_type,
         "condition": condition,
-        "facilities": facilities,
-        "amenities": amenities,
+        "facilities": list(facilities),
+        "amenities": list(amenities),
         "description": desc,
         "photo_urls": photos,
         "photo_count": len(photos),
@@ -392,12 +482,15 @@ def _map_district(raw: str) -> str:
     return DISTRICT_MAP.get(d, d)
 
 
-def scrape_search_pages(page: Page) -> list[SearchHit]:
+def scrape_search_pages(page: Page, *, cache_ttl: float = SEARCH_CACHE_TTL) -> list[SearchHit]:
     """
     Scrape list.am search listing pages and return a stable list of detail URLs with districts.
 
+    Pages cached less than `cache_ttl` seconds ago are read from disk instead of fetched.
     Note: District is only present on the search result cards (div.at).
     """
+    if os.environ.get("LISTAM_FORCE_REFRESH") == "1":
+        cache_ttl = 0
     hits: list[SearchHit] = []
     seen: set[int] = set()
 
@@ -411,23 +504,26 @@ def scrape_search_pages(page: Page) -> list[SearchHit]:
             break
         visited_urls.add(next_url)
 
-        print(f"  [list.am] Fetching search page {page_num}...")
         cache_path = RAW_DIR / f"listam_search_page_{page_num}.html"
-        # Always refresh search pages. Cloudflare / pagination can make stale caches misleading,
-        # and search pages are relatively cheap to fetch compared to detail pages.
-        time.sleep(REQUEST_DELAY)
-        page.goto(next_url, wait_until="domcontentloaded", timeout=60000)
-        html = page.content()
-        cache_path.write_text(html, encoding="utf-8")
-
-        soup = BeautifulSoup(html, "html.parser")
-        links = soup.select("a.h[href*='/item/']")
+        # Only reuse recent caches: Cloudflare / pagination can make stale ones misleading.
+        if cache_path.exists() and time.time() - cache_path.stat().st_mtime < cache_ttl:
+            print(f"  [list.am] Reading cached search page {page_num}...")
+            html = cache_path.read_text(encoding="utf-8")
+        else:
+            print(f"  [list.am] Fetching search page {page_num}...")
+            time.sleep(REQUEST_DELAY)
+            page.goto(next_url, wait_until="domcontentloaded", timeout=60000)
+            html = page.content()
+            cache_path.write_text(html, encoding="utf-8")
+
+        tree = lxml_html.fromstring(html) if html.strip() else None
+        links = _XP_SEARCH_LINKS(tree) if tree is not None else []
         if not links:
             break
 
         for a in links:
             href = a.get("href") or ""
-            m = re.search(r"/(?:en/)?item/(\d+)", href)
+            m = _ITEM_HREF_RE.search(href)
             if not m:
                 continue
             lid = int(m.group(1))
@@ -435,25 +531,25 @@ def scrape_search_pages(page: Page) -> list[SearchHit]:
                 continue
             seen.add(lid)
 
-            at = a.select_one("div.at")
+            at = _first(_XP_CARD_DISTRICT, a)
             district_raw = ""
-            if at:
-                t = at.get_text(" ", strip=True)
+            if at is not None:
+                t = _text(at)
                 # e.g. "Kentron, 2 rm."
                 district_raw = (t.split(",")[0] if "," in t else t).strip()
 
-            title_el = a.select_one("div.l")
-            search_title = title_el.get_text(" ", strip=True) if title_el else ""
+            title_el = _first(_XP_CARD_TITLE, a)
+            search_title = _text(title_el) if title_el is not None else ""
             detail_url = _canonical_listam_url(href)
             hits.append(SearchHit(id=lid, url=detail_url, district=_map_district(district_raw), search_title=search_title))
 
         # Follow "Next" pagination link.
         next_a = None
-        for cand in soup.select("span.pp a"):
-            if cand.get_text(" ", strip=True).lower().startswith("next"):
+        for cand in _XP_PAGER_LINKS(tree):
+            if _text(cand).lower().startswith("next"):
                 next_a = cand
                 break
-        if not next_a or not next_a.get("href"):
+        if next_a is None or not next_a.get("href"):
             break
 
         next_url = urljoin(BASE_URL, next_a.get("href"))
@@ -471,90 +567,154 @@ def _new_context(pw) -> BrowserContext:
             "Chrome/120.0.0.0 Safari/537.36"
         ),
         locale="en-US",
+        storage_state=STATE_PATH if STATE_PATH.exists() else None,
     )
     return ctx
 
 
+# Everything we parse is in the served HTML (itemprop markup, the pl1.init block), so the
+# browser only needs documents and scripts; scripts stay so Cloudflare's challenge can run.
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet", "websocket", "eventsource", "manifest"})
+# First-party and Cloudflare challenge hosts; analytics, ads and other third parties are dropped.
+_ALLOWED_HOSTS = ("list.am", "cloudflare.com")
+
+
+def _allowed_host(url: str) -> bool:
+    host = urlparse(url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in _ALLOWED_HOSTS)
+
+
+def _block_heavy_resources(route, request):
+    if request.resource_type in _BLOCKED_RESOURCE_TYPES or not _allowed_host(request.url):
+        return route.abort()
+    return route.continue_()
+
+
+def _new_page(pw) -> Page:
+    page = _new_context(pw).new_page()
+    page.route("**/*", _block_heavy_resources)
+    return page
+
+
+_RATE_LOCK = threading.Lock()
+_last_request_at = 0.0
+
+
+def _throttle() -> None:
+    """Space navigation starts REQUEST_DELAY apart across all browser pages."""
+    global _last_request_at
+    with _RATE_LOCK:
+        wait = _last_request_at + REQUEST_DELAY - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request_at = time.monotonic()
+
+
+def _detail_cache_path(h: SearchHit) -> Path:
+    return RAW_DIR / f"listam_detail_{h.id}.html"
+
+
+def _fetch_details_worker(jobs: queue.Queue, total: int) -> None:
+    # Playwright's sync API is not thread-safe, so each worker drives its own instance and browser.
+    with sync_playwright() as pw:
+        page = _new_page(pw)
+        while True:
+            try:
+                i, h = jobs.get_nowait()
+            except queue.Empty:
+                break
+            print(f"  [list.am] [{i}/{total}] Fetching detail #{h.id}...")
+            _throttle()
+            page.goto(h.url, wait_until="domcontentloaded", timeout=60000)
+            _detail_cache_path(h).write_text(page.content(), encoding="utf-8")
+        page.context.close()
+
+
+def fetch_details(hits: list[SearchHit]) -> None:
+    """Download detail pages for `hits` into RAW_DIR using DETAIL_WORKERS concurrent browser pages."""
+    jobs: queue.Queue = queue.Queue()
+    for i, h in enumerate(hits, 1):
+        jobs.put((i, h))
+    workers = min(DETAIL_WORKERS, len(hits))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(_fetch_details_worker, jobs, len(hits)) for _ in range(workers)]
+        for fut in futures:
+            # Re-raise navigation failures as the sequential loop did.
+            fut.result()
+
+
+def _needs_fetch(prev: dict | None) -> bool:
+    # New listings, and cached ones missing core content (photos, coords, dates), are (re)fetched.
+    return (
+        not prev
+        or not prev.get("photo_urls")
+        or prev.get("lat") is None
+        or prev.get("lng") is None
+        or not prev.get("listed_date")
+        or not prev.get("facilities")
+        or prev.get("building_type") is None
+        or prev.get("condition") is None
+    )
+
+
+def _parse_cached_detail(h: SearchHit) -> dict:
+    # Reads its own cache file so pool workers receive a small SearchHit rather than the page HTML.
+    html = _detail_cache_path(h).read_bytes()
+    return parse_detail_page(h.url, html, district_from_search=h.district)
+
+
 def run_listam_scraper() -> list[dict]:
     """Main entry point: scrape search + details for list.am, return structured data."""
     RAW_DIR.mkdir(parents=True, exist_ok=True)
 
     existing: dict[int, dict] = {}
+    previous: list = []
     if OUT_PATH.exists():
-        with open(OUT_PATH, encoding="utf-8") as f:
-            for item in json.load(f):
-                if isinstance(item, dict) and isinstance(item.get("id"), int):
-                    existing[item["id"]] = item
+        previous = orjson.loads(OUT_PATH.read_bytes())
+        for item in previous:
+            if isinstance(item, dict) and isinstance(item.get("id"), int):
+                existing[item["id"]] = item
         print(f"  Loaded {len(existing)} cached list.am listings")
 
     with sync_playwright() as pw:
-        ctx = _new_context(pw)
-        page = ctx.new_page()
+        page = _new_page(pw)
+        hits = scrape_search_pages(page)
+        # Detail workers start their own browsers from this state.
+        page.context.storage_state(path=STATE_PATH)
+        page.context.close()
+    print(f"  Total unique list.am listings found: {len(hits)}")
 
-        # Avoid loading heavy resources (images/fonts/media).
-        def _route(route, request):
-            if request.resource_type in {"image", "media", "font"}:
-                return route.abort()
-            return route.continue_()
+    to_fetch = [h for h in hits if _needs_fetch(existing.get(h.id))]
 
-        page.route("**/*", _route)
+    print(f"  list.am listings to fetch: {len(to_fetch)} (skipping {len(hits) - len(to_fetch)} cached)")
 
-        hits = scrape_search_pages(page)
-        print(f"  Total unique list.am listings found: {len(hits)}")
+    missing = [h for h in to_fetch if not _detail_cache_path(h).exists()]
+    if missing:
+        fetch_details(missing)
 
-        to_fetch: list[SearchHit] = []
-        for h in hits:
-            prev = existing.get(h.id)
-            if not prev:
-                to_fetch.append(h)
-                continue
-            # Re-fetch if missing core content (photos, coords, dates).
-            if (
-                not prev.get("photo_urls")
-                or prev.get("lat") is None
-                or prev.get("lng") is None
-                or not prev.get("listed_date")
-                or not prev.get("facilities")
-                or prev.get("building_type") is None
-                or prev.get("condition") is None
-            ):
-                to_fetch.append(h)
-
-        print(f"  list.am listings to fetch: {len(to_fetch)} (skipping {len(hits) - len(to_fetch)} cached)")
-
-        total = len(to_fetch)
-        for i, h in enumerate(to_fetch, 1):
-            print(f"  [list.am] [{i}/{total}] Fetching detail #{h.id}...")
-            cache_name = f"listam_detail_{h.id}.html"
-            cache_path = RAW_DIR / cache_name
-            if cache_path.exists():
-                html = cache_path.read_text(encoding="utf-8")
-            else:
-                time.sleep(REQUEST_DELAY)
-                page.goto(h.url, wait_until="domcontentloaded", timeout=60000)
-                html = page.content()
-                cache_path.write_text(html, encoding="utf-8")
-
-            data = parse_detail_page(h.url, html, district_from_search=h.district)
-            if isinstance(data, dict) and isinstance(data.get("id"), int):
-                # Fallback title from search if missing.
-                if not (data.get("title") or "").strip() and h.search_title:
-                    data["title"] = h.search_title
-                existing[data["id"]] = data
-
-        # Close browser
-        ctx.close()
+    # Parsing is pure CPU; spread large batches (e.g. a re-parse of cached pages) over cores.
+    if len(to_fetch) < PARSE_POOL_MIN:
+        parsed = [_parse_cached_detail(h) for h in to_fetch]
+    else:
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+            parsed = list(pool.map(_parse_cached_detail, to_fetch, chunksize=8))
+
+    for h, data in zip(to_fetch, parsed):
+        if isinstance(data, dict) and isinstance(data.get("id"), int):
+            # Fallback title from search if missing.
+            if not (data.get("title") or "").strip() and h.search_title:
+                data["title"] = h.search_title
+            existing[data["id"]] = data
 
     # Preserve stable ordering from search pages.
-    listings: list[dict] = []
-    for h in hits:
-        if h.id in existing:
-            listings.append(existing[h.id])
-
-    OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(OUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(listings, f, indent=2, ensure_ascii=False)
-    print(f"\n  Saved {len(listings)} list.am listings to {OUT_PATH}")
+    listings = [existing[h.id] for h in hits if h.id in existing]
+
+    # Warm runs that re-fetch nothing usually reproduce the file exactly; skip re-serializing it.
+    if OUT_PATH.exists() and listings == previous:
+        print(f"\n  {OUT_PATH} unchanged ({len(listings)} list.am listings)")
+    else:
+        write_json(OUT_PATH, listings)
+        print(f"\n  Saved {len(listings)} list.am listings to {OUT_PATH}")
     return listings
 
 
@@ -1,13 +1,20 @@
 import hashlib
-import json
+import heapq
+import itertools
 import math
 import re
+import sqlite3
+import threading
 import time
-from dataclasses import dataclass
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 OVERPASS_URLS = [
     "https://overpass-api.de/api/interpreter",
@@ -22,11 +29,57 @@ YEREVAN_BBOX = (40.10, 44.40, 40.30, 44.65)
 RAW_DIR = Path("data/raw")
 RAW_DIR.mkdir(parents=True, exist_ok=True)
 
-# Be polite to Overpass. Cache makes this mostly a one-time cost.
+# Be polite to Overpass: at most one request per REQUEST_DELAY to each instance.
+# Cache makes this mostly a one-time cost.
 REQUEST_DELAY = 1.1
-
-
-def _post_overpass(query: str) -> dict:
+# Uncached streets are fetched concurrently, two in flight per instance.
+OVERPASS_WORKERS = 2 * len(OVERPASS_URLS)
+# Streets per batched query; larger batches risk hitting the server-side timeout.
+OVERPASS_BATCH_SIZE = 25
+# The spread loop is cache reads and NumPy work, so per-street progress lines are mostly noise.
+PROGRESS_EVERY = 25
+
+# Keep-alive connections shared by the fetch threads. No adapter-level retries:
+# _post_overpass already falls back to the next instance on 429/5xx.
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_ADAPTER = HTTPAdapter(pool_connections=len(OVERPASS_URLS), pool_maxsize=OVERPASS_WORKERS, max_retries=0)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+_ENDPOINT_LOCKS = {url: threading.Lock() for url in OVERPASS_URLS}
+_last_request_at = {url: 0.0 for url in OVERPASS_URLS}
+# Round-robin start instance, so concurrent queries spread over all endpoints.
+_NEXT_ENDPOINT = itertools.count()
+
+# All Overpass responses live in one SQLite file keyed by street slug; the
+# connection is shared by the prefetch threads behind a lock.
+_CACHE_LOCK = threading.Lock()
+_cache_db: Optional[sqlite3.Connection] = None
+
+# Compiled once: _slug and _normalize_street_for_query run for every street label.
+_NON_SLUG_RE = re.compile(r"[^a-z0-9]+")
+_PARENS_RE = re.compile(r"\s*\([^)]*\)\s*")
+# Trailing words stripped in this order, each at most once.
+_STREET_SUFFIX_RES = tuple(
+    re.compile(rf"\s+{word}$", re.I) for word in ("district", "dead end", "alley", "hightway", "highway")
+)
+_AVE_RE = re.compile(r"\bAve\b\.?")
+_AV_RE = re.compile(r"\bav\b\.?", re.I)
+_ST_RE = re.compile(r"\bSt\b\.?")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _throttle(url: str) -> None:
+    """Space request starts to one Overpass instance REQUEST_DELAY apart across threads."""
+    with _ENDPOINT_LOCKS[url]:
+        wait = _last_request_at[url] + REQUEST_DELAY - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request_at[url] = time.monotonic()
+
+
+def _post_overpass(query: str, *, read_timeout: float = 35) -> dict:
     """
     Execute an Overpass query with basic retries and endpoint fallback.
     """
@@ -34,17 +87,24 @@ def _post_overpass(query: str) -> dict:
     # Keep delays bounded; caching means we only pay this once per street.
     last_err: Exception | None = None
 
-    for url in OVERPASS_URLS:
-        time.sleep(REQUEST_DELAY)
+    start = next(_NEXT_ENDPOINT) % len(OVERPASS_URLS)
+    for url in OVERPASS_URLS[start:] + OVERPASS_URLS[:start]:
+        _throttle(url)
         try:
-            resp = requests.post(url, data={"data": query}, headers=HEADERS, timeout=(10, 35))
+            resp = _SESSION.post(url, data={"data": query}, timeout=(10, read_timeout))
             # Treat 429/5xx as retryable by falling back to another instance.
             if resp.status_code == 429:
                 raise requests.HTTPError("429 Too Many Requests", response=resp)
             if resp.status_code in {502, 503, 504}:
                 raise requests.HTTPError(f"{resp.status_code} Server Error", response=resp)
             resp.raise_for_status()
-            return resp.json()
+            data = resp.json()
+            # Timeouts and out-of-memory aborts still come back as HTTP 200, with a remark and
+            # partial (or no) elements; never let those be cached as the answer.
+            remark = data.get("remark") or ""
+            if "runtime error" in remark:
+                raise RuntimeError(f"Overpass {remark}")
+            return data
         except Exception as e:
             last_err = e
             # Short backoff before trying the next instance.
@@ -57,56 +117,58 @@ def _post_overpass(query: str) -> dict:
 
 def _slug(s: str) -> str:
     s = s.strip().lower()
-    s = re.sub(r"[^a-z0-9]+", "_", s)
+    s = _NON_SLUG_RE.sub("_", s)
     return s.strip("_") or "street"
 
 
-def _stable_u32(value: str) -> int:
-    h = hashlib.sha256(value.encode("utf-8")).digest()
-    return int.from_bytes(h[:4], "big")
+def _stable_u32_pair(value: str) -> tuple[int, int]:
+    """Two independent stable 32-bit values from one 8-byte BLAKE2b digest."""
+    h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+    return h >> 32, h & 0xFFFFFFFF
 
 
-def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+def _segment_lengths_m(line: np.ndarray) -> np.ndarray:
+    """Haversine length of each segment of an (N, 2) lat/lon polyline, computed over the whole array."""
     r = 6371000.0
-    p1 = math.radians(lat1)
-    p2 = math.radians(lat2)
-    dp = p2 - p1
-    dl = math.radians(lon2 - lon1)
-    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
-    return 2 * r * math.asin(math.sqrt(a))
-
+    rad = np.radians(line)
+    p = rad[:, 0]
+    # cos(lat) once per vertex; every inner vertex is shared by two segments.
+    cos_p = np.cos(p)
+    a = np.sin(np.diff(p) / 2) ** 2 + cos_p[:-1] * cos_p[1:] * np.sin(np.diff(rad[:, 1]) / 2) ** 2
+    return 2 * r * np.arcsin(np.sqrt(a))
 
-def _polyline_length_m(line: list[tuple[float, float]]) -> float:
-    if len(line) < 2:
-        return 0.0
-    total = 0.0
-    for (a_lat, a_lon), (b_lat, b_lon) in zip(line, line[1:]):
-        total += _haversine_m(a_lat, a_lon, b_lat, b_lon)
-    return total
 
-
-def _nearest_vertex_dist_m(point: tuple[float, float], line: list[tuple[float, float]]) -> float:
+def _nearest_vertex_dist_m(point: tuple[float, float], line: np.ndarray, cos_lat0: float) -> float:
+    """
+    Equirectangular distance to the closest vertex; well under 1% off haversine at city scale,
+    which is plenty for a relevance cut-off. cos_lat0 is cos(radians(point latitude)).
+    """
     lat, lon = point
-    best = float("inf")
-    for v_lat, v_lon in line:
-        d = _haversine_m(lat, lon, v_lat, v_lon)
-        if d < best:
-            best = d
-    return best
+    return float(np.hypot((line[:, 0] - lat) * 111_111.0, (line[:, 1] - lon) * (111_111.0 * cos_lat0)).min())
 
 
 def _normalize_street_for_query(street: str) -> str:
-    s = re.sub(r"\s*\([^)]*\)\s*", " ", street).strip()
-    s = re.sub(r"\s+district$", "", s, flags=re.I).strip()
-    s = re.sub(r"\s+dead end$", "", s, flags=re.I).strip()
-    s = re.sub(r"\s+alley$", "", s, flags=re.I).strip()
-    s = re.sub(r"\s+hightway$", "", s, flags=re.I).strip()
-    s = re.sub(r"\s+highway$", "", s, flags=re.I).strip()
+    s = _PARENS_RE.sub(" ", street).strip()
+    for suffix_re in _STREET_SUFFIX_RES:
+        s = suffix_re.sub("", s).strip()
     # common abbreviations
-    s = re.sub(r"\bAve\b\.?", "Avenue", s)
-    s = re.sub(r"\bav\b\.?", "Avenue", s, flags=re.I)
-    s = re.sub(r"\bSt\b\.?", "Street", s)
-    return re.sub(r"\s+", " ", s).strip()
+    s = _AVE_RE.sub("Avenue", s)
+    s = _AV_RE.sub("Avenue", s)
+    s = _ST_RE.sub("Street", s)
+    return _WHITESPACE_RE.sub(" ", s).strip()
+
+
+def _already_spread(items: list[dict]) -> bool:
+    """
+    True when a previous run already laid exactly these listings out along the street, so Overpass
+    can be skipped. Each spread listing records how many were spread with it (spread_count): if a
+    listing joined or left the street since, the count no longer matches and the street is re-spread
+    to close the gap. Jittered or freshly geocoded listings are always re-spread.
+    """
+    n = len(items)
+    if any(l.get("geocode_precision") != "street_spread" or l.get("spread_count") != n for l in items):
+        return False
+    return len({(float(l["lat"]), float(l["lng"])) for l in items}) == n
 
 
 def _is_area_like(street: str) -> bool:
@@ -114,14 +176,133 @@ def _is_area_like(street: str) -> bool:
     return "district" in s
 
 
-@dataclass(frozen=True)
 class StreetGeometry:
-    # A street may be represented by multiple disconnected ways.
-    lines: list[list[tuple[float, float]]]
-
-    @property
-    def total_length_m(self) -> float:
-        return sum(_polyline_length_m(line) for line in self.lines)
+    # A street may be represented by multiple disconnected ways, each an (N, 2) lat/lon array.
+    # Lengths are computed once up front: fetch_street_geometry checks the total straight away
+    # and interpolation walks the per-segment lengths.
+    __slots__ = ("lines", "segment_lengths_m", "total_length_m")
+
+    def __init__(self, lines: list[np.ndarray]) -> None:
+        self.lines = lines
+        self.segment_lengths_m = [_segment_lengths_m(line) for line in lines]
+        self.total_length_m = sum(float(segs.sum()) for segs in self.segment_lengths_m)
+
+
+def _overpass_cache() -> sqlite3.Connection:
+    global _cache_db
+    if _cache_db is None:
+        _cache_db = sqlite3.connect(RAW_DIR / "overpass_cache.sqlite", check_same_thread=False)
+        _cache_db.execute("CREATE TABLE IF NOT EXISTS overpass (key TEXT PRIMARY KEY, data BLOB NOT NULL)")
+    return _cache_db
+
+
+def _cache_put(key: str, data: dict) -> None:
+    blob = orjson.dumps(data)
+    with _CACHE_LOCK:
+        db = _overpass_cache()
+        db.execute("INSERT OR REPLACE INTO overpass (key, data) VALUES (?, ?)", (key, blob))
+        db.commit()
+
+
+def _cache_get(key: str) -> Optional[dict]:
+    with _CACHE_LOCK:
+        row = _overpass_cache().execute("SELECT data FROM overpass WHERE key = ?", (key,)).fetchone()
+    if row is not None:
+        return orjson.loads(row[0])
+    # Per-street JSON files from before the single-file cache are migrated on first read.
+    legacy = RAW_DIR / f"overpass_{key}.json"
+    if legacy.exists():
+        data = orjson.loads(legacy.read_bytes())
+        _cache_put(key, data)
+        return data
+    return None
+
+
+def _is_cached(key: str) -> bool:
+    with _CACHE_LOCK:
+        row = _overpass_cache().execute("SELECT 1 FROM overpass WHERE key = ?", (key,)).fetchone()
+    return row is not None or (RAW_DIR / f"overpass_{key}.json").exists()
+
+
+def _overpass_query(names: list[str], bbox: tuple[float, float, float, float], *, timeout: int = 60) -> str:
+    south, west, north, east = bbox
+    # Use a loose regex to tolerate Street/street naming differences and minor variations.
+    # Overpass regex flags are provided after the pattern (e.g. ~"foo",i).
+    pattern = "|".join(re.escape(name).replace('"', r"\"") for name in names)
+    return (
+        f"[out:json][timeout:{timeout}];"
+        f"(way[\"highway\"][\"name:en\"~\"{pattern}\",i]({south},{west},{north},{east});"
+        f"way[\"highway\"][\"name\"~\"{pattern}\",i]({south},{west},{north},{east}););"
+        "out geom;"
+    )
+
+
+def _overpass_street_data(normalized: str, bbox: tuple[float, float, float, float]) -> dict:
+    """Overpass response for ways named like `normalized`, from the cache or a fresh query."""
+    key = _slug(normalized)
+    data = _cache_get(key)
+    if data is None:
+        data = _post_overpass(_overpass_query([normalized], bbox))
+        _cache_put(key, data)
+    return data
+
+
+def _fetch_overpass_batch(normalized_names: list[str], bbox: tuple[float, float, float, float]) -> None:
+    """
+    One Overpass query for several streets. The response is split back per street by way name
+    and cached exactly as a single-street query would have been.
+    """
+    data = _post_overpass(_overpass_query(normalized_names, bbox, timeout=180), read_timeout=180)
+    elems = data.get("elements", [])
+    for normalized in normalized_names:
+        name_re = re.compile(re.escape(normalized), re.I)
+        subset = [
+            e
+            for e in elems
+            if any(name_re.search((e.get("tags") or {}).get(k, "")) for k in ("name:en", "name"))
+        ]
+        _cache_put(_slug(normalized), {**data, "elements": subset})
+
+
+def prefetch_street_geometries(
+    street_names: list[str],
+    bbox: tuple[float, float, float, float] = YEREVAN_BBOX,
+) -> dict[str, Exception]:
+    """
+    Fill the Overpass cache for all uncached streets, OVERPASS_BATCH_SIZE streets per query,
+    with the batches running concurrently. Streets of a failed batch are retried one query each.
+    Returns the error for each street whose own query also failed on every instance.
+    """
+    misses: dict[str, list[str]] = {}
+    for name in street_names:
+        normalized = _normalize_street_for_query(name)
+        if not _is_cached(_slug(normalized)):
+            misses.setdefault(normalized, []).append(name)
+    if not misses:
+        return {}
+
+    pending = list(misses)
+    batches = [pending[i : i + OVERPASS_BATCH_SIZE] for i in range(0, len(pending), OVERPASS_BATCH_SIZE)]
+    print(f"  Spread: fetching {len(pending)} uncached street geometries from Overpass in {len(batches)} batch(es)...")
+    errors: dict[str, Exception] = {}
+    with ThreadPoolExecutor(max_workers=OVERPASS_WORKERS) as ex:
+        futures = {ex.submit(_fetch_overpass_batch, batch, bbox): batch for batch in batches}
+        retry: list[str] = []
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+            except Exception as e:
+                print(f"  Spread: Overpass batch of {len(futures[fut])} streets failed ({e}); retrying one by one")
+                retry.extend(futures[fut])
+
+        futures = {ex.submit(_overpass_street_data, normalized, bbox): normalized for normalized in retry}
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+            except Exception as e:
+                for name in misses[futures[fut]]:
+                    errors[name] = e
+    return errors
 
 
 def fetch_street_geometry(
@@ -131,41 +312,30 @@ def fetch_street_geometry(
 ) -> Optional[StreetGeometry]:
     """
     Fetch road geometry for `street_name` from Overpass. Returns a set of polylines (ways).
-    Uses a cache under data/raw/overpass_<slug>.json.
+    Uses the Overpass cache in data/raw/overpass_cache.sqlite.
     """
     normalized = _normalize_street_for_query(street_name)
-    cache_path = RAW_DIR / f"overpass_{_slug(normalized)}.json"
-
-    if cache_path.exists():
-        data = json.loads(cache_path.read_text(encoding="utf-8"))
-    else:
-        south, west, north, east = bbox
-        # Use a loose regex to tolerate Street/street naming differences and minor variations.
-        # Overpass regex flags are provided after the pattern (e.g. ~"foo",i).
-        pattern = re.escape(normalized).replace('"', r"\"")
-        query = (
-            "[out:json][timeout:60];"
-            f"(way[\"highway\"][\"name:en\"~\"{pattern}\",i]({south},{west},{north},{east});"
-            f"way[\"highway\"][\"name\"~\"{pattern}\",i]({south},{west},{north},{east}););"
-            "out geom;"
-        )
-        data = _post_overpass(query)
-        cache_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    data = _overpass_street_data(normalized, bbox)
 
     elems = data.get("elements", [])
     if not elems:
         return None
 
-    # Extract candidate polylines
-    candidates: list[list[tuple[float, float]]] = []
+    # Extract candidate polylines, flagging ways that carry exactly the street's name (ignoring
+    # case and spacing); the Overpass regex itself is only a loose substring match.
+    wanted = normalized.casefold()
+    candidates: list[tuple[np.ndarray, bool]] = []
     for e in elems:
         if e.get("type") != "way":
             continue
         geom = e.get("geometry") or []
         if len(geom) < 2:
             continue
-        line = [(float(p["lat"]), float(p["lon"])) for p in geom]
-        candidates.append(line)
+        # One flat list per axis converts to float64 in C far faster than a list of pairs.
+        line = np.array(([p["lat"] for p in geom], [p["lon"] for p in geom]), dtype=np.float64).T
+        tags = e.get("tags") or {}
+        exact = any(_WHITESPACE_RE.sub(" ", tags.get(k, "")).strip().casefold() == wanted for k in ("name:en", "name"))
+        candidates.append((line, exact))
 
     if not candidates:
         return None
@@ -173,18 +343,16 @@ def fetch_street_geometry(
     # Keep only ways plausibly near the original centroid (helps when regex matches too much).
     # Choose ways within 2km of the centroid by nearest vertex distance.
     max_keep_dist_m = 2000.0
-    centroid_latlng = centroid
-    near = [(line, _nearest_vertex_dist_m(centroid_latlng, line)) for line in candidates]
-    near.sort(key=lambda x: x[1])
-    near = [(line, d) for (line, d) in near if d <= max_keep_dist_m]
+    cos_lat0 = math.cos(math.radians(centroid[0]))
+    dists = [(line, _nearest_vertex_dist_m(centroid, line, cos_lat0), exact) for line, exact in candidates]
+    near = sorted((x for x in dists if x[1] <= max_keep_dist_m), key=lambda x: x[1])
+    # Among nearby ways, exact name matches win over looser ones (e.g. "Small Abovyan Street").
+    near = [x for x in near if x[2]] or near
     if not near:
         # If nothing is within 2km, fall back to best few matches.
-        near = [(line, d) for (line, d) in [(line, _nearest_vertex_dist_m(centroid_latlng, line)) for line in candidates]]
-        near.sort(key=lambda x: x[1])
-        near = near[:5]
+        near = heapq.nsmallest(5, dists, key=lambda x: x[1])
 
-    lines = [line for (line, _d) in near]
-    geom = StreetGeometry(lines=lines)
+    geom = StreetGeometry(lines=[line for (line, _d, _exact) in near])
     if geom.total_length_m <= 50:
         return None
     return geom
@@ -197,46 +365,33 @@ def interpolate_points_along_geometry(geom: StreetGeometry, n: int) -> list[tupl
     if n <= 0:
         return []
 
-    lengths = [max(_polyline_length_m(line), 0.0) for line in geom.lines]
-    total = sum(lengths)
+    # Cumulative arc length along each line, and of the lines end to end.
+    seg_lens = geom.segment_lengths_m
+    seg_cums = [np.cumsum(segs) for segs in seg_lens]
+    line_cum = np.cumsum([sc[-1] if len(sc) else 0.0 for sc in seg_cums])
+    total = float(line_cum[-1])
     if total <= 0:
         return []
 
-    # Build cumulative table of (line_index, cumulative_length)
-    cum = []
-    running = 0.0
-    for i, ln in enumerate(lengths):
-        running += ln
-        cum.append((i, running))
-
-    def point_at_distance(line: list[tuple[float, float]], dist_m: float) -> tuple[float, float]:
-        if dist_m <= 0:
-            return line[0]
-        remaining = dist_m
-        for (a_lat, a_lon), (b_lat, b_lon) in zip(line, line[1:]):
-            seg = _haversine_m(a_lat, a_lon, b_lat, b_lon)
-            if seg <= 0:
-                continue
-            if remaining <= seg:
-                t = remaining / seg
-                return (a_lat + (b_lat - a_lat) * t, a_lon + (b_lon - a_lon) * t)
-            remaining -= seg
-        return line[-1]
-
-    out: list[tuple[float, float]] = []
-    for i in range(n):
-        target = total * ((i + 0.5) / n)
-        # Find which polyline this target falls on
-        prev_c = 0.0
-        chosen_idx = 0
-        for idx, c in cum:
-            if target <= c:
-                chosen_idx = idx
-                break
-            prev_c = c
-        local = target - prev_c
-        out.append(point_at_distance(geom.lines[chosen_idx], local))
-    return out
+    # Locate every target on its line, then on its segment, by binary search.
+    targets = total * ((np.arange(n) + 0.5) / n)
+    line_idx = np.minimum(np.searchsorted(line_cum, targets), len(line_cum) - 1)
+    local = targets - np.concatenate(([0.0], line_cum[:-1]))[line_idx]
+
+    out = np.empty((n, 2))
+    for li in np.unique(line_idx):
+        mask = line_idx == li
+        line, segs, sc = geom.lines[li], seg_lens[li], seg_cums[li]
+        if not len(segs):
+            out[mask] = line[0]
+            continue
+        dist = local[mask]
+        si = np.minimum(np.searchsorted(sc, dist), len(sc) - 1)
+        seg = segs[si]
+        # Distances before the start or past the end clamp to the line's endpoints.
+        t = np.clip(np.divide(dist - (sc[si] - seg), seg, out=np.zeros_like(dist), where=seg > 0), 0.0, 1.0)
+        out[mask] = line[si] + (line[si + 1] - line[si]) * t[:, None]
+    return [tuple(p) for p in out.tolist()]
 
 
 def deterministic_jitter(
@@ -248,18 +403,37 @@ def deterministic_jitter(
     """
     Deterministically place a point within radius_m of center.
     """
+    return deterministic_jitter_many(center, [listing_id], radius_m=radius_m)[0]
+
+
+def deterministic_jitter_many(
+    center: tuple[float, float],
+    listing_ids: list[int],
+    *,
+    radius_m: float,
+) -> list[tuple[float, float]]:
+    """
+    Deterministically place each listing within radius_m of center, computed over NumPy arrays.
+    """
     lat, lon = center
-    u = _stable_u32(str(listing_id))
+    u = np.array([_stable_u32_pair(str(lid)) for lid in listing_ids], dtype=np.uint64).reshape(-1, 2)
     # angle in [0, 2pi)
-    angle = (u % 3600) / 3600.0 * 2.0 * math.pi
+    angle = (u[:, 0] % 3600) / 3600.0 * 2.0 * math.pi
     # radius in [0, radius_m), with sqrt for uniform area
-    u2 = _stable_u32(f"{listing_id}:r")
-    r = radius_m * math.sqrt((u2 % 10_000) / 10_000.0)
+    r = radius_m * np.sqrt((u[:, 1] % 10_000) / 10_000.0)
 
-    dlat = (r * math.cos(angle)) / 111_111.0
+    dlat = (r * np.cos(angle)) / 111_111.0
     denom = 111_111.0 * max(math.cos(math.radians(lat)), 1e-6)
-    dlon = (r * math.sin(angle)) / denom
-    return (lat + dlat, lon + dlon)
+    dlon = (r * np.sin(angle)) / denom
+    return list(zip((lat + dlat).tolist(), (lon + dlon).tolist()))
+
+
+def _jitter_in_place(items: list[dict], center: tuple[float, float], radius_m: float, precision: str) -> int:
+    pts = deterministic_jitter_many(center, [int(l["id"]) for l in items], radius_m=radius_m)
+    for l, (lat2, lng2) in zip(items, pts):
+        l["lat"], l["lng"] = lat2, lng2
+        l["geocode_precision"] = precision
+    return len(items)
 
 
 def run_spread(listings: list[dict]) -> list[dict]:
@@ -297,33 +471,39 @@ def run_spread(listings: list[dict]) -> list[dict]:
     streets.sort(key=lambda x: (-len(x[1]), x[0].lower()))
 
     total_streets = len(streets)
+    # Queries for uncached streets run up front in parallel; the loop below then reads the cache.
+    failed = prefetch_street_geometries(
+        [street for street, items in streets if not _is_area_like(street) and not _already_spread(items)]
+    )
     for idx, (street, items) in enumerate(streets, 1):
         if len(items) <= 1:
             continue
 
-        print(f"  Spread [{idx}/{total_streets}] {street} ({len(items)} listings)...")
+        if idx % PROGRESS_EVERY == 0 or idx == total_streets:
+            print(f"  Spread [{idx}/{total_streets}] {street} ({len(items)} listings)...")
 
         # If it's actually an area/neighborhood name, jitter instead of line-spreading.
         if _is_area_like(street):
             # Keep as jittered (or apply jitter deterministically if still "street")
             center = (float(items[0]["lat"]), float(items[0]["lng"]))
-            radius = 300.0
-            for l in items:
-                lid = int(l["id"])
-                lat2, lng2 = deterministic_jitter(center, lid, radius_m=radius)
-                l["lat"], l["lng"] = lat2, lng2
-                l["geocode_precision"] = "district_jitter"
-                moved += 1
-                jittered += 1
+            n = _jitter_in_place(items, center, 300.0, "district_jitter")
+            moved += n
+            jittered += n
+            continue
+
+        if _already_spread(items):
             continue
 
         # Try to fetch geometry once per street.
-        ref_center = (
-            sum(float(l["lat"]) for l in items) / len(items),
-            sum(float(l["lng"]) for l in items) / len(items),
-        )
+        sum_lat = sum_lng = 0.0
+        for l in items:
+            sum_lat += float(l["lat"])
+            sum_lng += float(l["lng"])
+        ref_center = (sum_lat / len(items), sum_lng / len(items))
         geom = None
         try:
+            if street in failed:
+                raise failed[street]
             geom = fetch_street_geometry(street, centroid=ref_center)
         except Exception as e:
             print(f"  Spread: Overpass error for '{street}': {e}")
@@ -331,15 +511,9 @@ def run_spread(listings: list[dict]) -> list[dict]:
 
         if not geom:
             # Small jitter fallback (street-level but no geometry)
-            center = ref_center
-            radius = 80.0
-            for l in items:
-                lid = int(l["id"])
-                lat2, lng2 = deterministic_jitter(center, lid, radius_m=radius)
-                l["lat"], l["lng"] = lat2, lng2
-                l["geocode_precision"] = "street_jitter"
-                moved += 1
-                jittered += 1
+            n = _jitter_in_place(items, ref_center, 80.0, "street_jitter")
+            moved += n
+            jittered += n
             continue
 
         spread_streets += 1
@@ -349,24 +523,21 @@ def run_spread(listings: list[dict]) -> list[dict]:
             for l, (lat2, lng2) in zip(items_sorted, pts):
                 l["lat"], l["lng"] = lat2, lng2
                 l["geocode_precision"] = "street_spread"
+                l["spread_count"] = len(items_sorted)
                 moved += 1
 
-    # Jitter district-level stacks (only when stacked at same coordinate)
-    coord_groups_d: dict[tuple[float, float], list[dict]] = {}
+    # Jitter district-level stacks (only when stacked at same coordinate).
+    # Keys are rounded to ~11 cm so float noise from different sources doesn't split a stack.
+    coord_groups_d: dict[tuple[float, float], list[dict]] = defaultdict(list)
     for l in district_level:
-        coord_groups_d.setdefault((float(l["lat"]), float(l["lng"])), []).append(l)
+        coord_groups_d[(round(float(l["lat"]), 6), round(float(l["lng"]), 6))].append(l)
     for group in coord_groups_d.values():
         if len(group) <= 1:
             continue
         center = (float(group[0]["lat"]), float(group[0]["lng"]))
-        radius = 400.0
-        for l in group:
-            lid = int(l["id"])
-            lat2, lng2 = deterministic_jitter(center, lid, radius_m=radius)
-            l["lat"], l["lng"] = lat2, lng2
-            l["geocode_precision"] = "district_jitter"
-            moved += 1
-            jittered += 1
+        n = _jitter_in_place(group, center, 400.0, "district_jitter")
+        moved += n
+        jittered += n
 
     print(f"  Spread: moved {moved} listings ({spread_streets} streets spread, {jittered} jittered)")
     return listings
@@ -0,0 +1,95 @@
+import copy
+import tempfile
+import unittest
+from pathlib import Path
+
+import spread
+from main import _merge_prev
+
+# Two ways of Abovyan Street near the centre, each a few hundred metres long.
+_OVERPASS_RESPONSE = {
+    "elements": [
+        {
+            "type": "way",
+            "tags": {"name:en": "Abovyan Street"},
+            "geometry": [{"lat": 40.1800, "lon": 44.5100}, {"lat": 40.1830, "lon": 44.5130}],
+        },
+        {
+            "type": "way",
+            "tags": {"name:en": "Abovyan Street"},
+            "geometry": [{"lat": 40.1830, "lon": 44.5130}, {"lat": 40.1860, "lon": 44.5160}],
+        },
+    ]
+}
+
+
+def _scraped() -> list[dict]:
+    """Listings as the scrapers produce them: no coordinates yet."""
+    return [{"id": i, "street": "Abovyan St", "lat": None, "lng": None} for i in range(101, 105)]
+
+
+class RunSpreadAcrossRunsTest(unittest.TestCase):
+    def setUp(self):
+        self._saved = (spread.RAW_DIR, spread._cache_db, spread._post_overpass)
+        self.calls = 0
+
+        def fake_post(query, **kwargs):
+            self.calls += 1
+            return copy.deepcopy(_OVERPASS_RESPONSE)
+
+        spread._post_overpass = fake_post
+        self._use_fresh_cache()
+
+    def tearDown(self):
+        if spread._cache_db is not None:
+            spread._cache_db.close()
+        spread.RAW_DIR, spread._cache_db, spread._post_overpass = self._saved
+
+    def _use_fresh_cache(self):
+        if spread._cache_db is not None:
+            spread._cache_db.close()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        spread.RAW_DIR = Path(tmp.name)
+        spread._cache_db = None
+
+    def test_second_run_skips_overpass_for_already_spread_street(self):
+        # First run: listings geocoded to the same street-level point get spread along the street.
+        first = _scraped()
+        for l in first:
+            l.update(lat=40.1830, lng=44.5130, geocode_precision="street")
+        first = spread.run_spread(first)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(l["geocode_precision"] == "street_spread" for l in first))
+        self.assertTrue(all(l["spread_count"] == 4 for l in first))
+
+        # Next pipeline run: fresh scrape, geo fields carried forward, empty Overpass cache.
+        self._use_fresh_cache()
+        prev_by_id = {l["id"]: copy.deepcopy(l) for l in first}
+        second = _scraped()
+        for l in second:
+            _merge_prev(l, prev_by_id[l["id"]])
+        second = spread.run_spread(second)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([(l["lat"], l["lng"]) for l in second], [(l["lat"], l["lng"]) for l in first])
+
+    def test_street_is_respread_when_a_listing_leaves(self):
+        first = _scraped()
+        for l in first:
+            l.update(lat=40.1830, lng=44.5130, geocode_precision="street")
+        first = spread.run_spread(first)
+
+        self._use_fresh_cache()
+        prev_by_id = {l["id"]: copy.deepcopy(l) for l in first}
+        second = _scraped()[:3]
+        for l in second:
+            _merge_prev(l, prev_by_id[l["id"]])
+        second = spread.run_spread(second)
+
+        self.assertEqual(self.calls, 2)
+        self.assertTrue(all(l["spread_count"] == 3 for l in second))
+
+
+if __name__ == "__main__":
+    unittest.main()